@@ -0,0 +1,178 @@
+import os
+import re
+import sys
+import csv
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Tuple
+
+from chunk_cache import ChunkCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES
+from combined_analyzer import OUTPUT_FORMATS, RENDERERS, compute_project_analysis
+from utils import make_executor
+
+AGGREGATE_COLUMNS = [
+    'repo', 'root', 'status', 'seconds', 'files_processed', 'total_chunks', 'total_tokens', 'avg_tokens_per_chunk',
+    'one_time_cost', 'monthly_storage_cost', 'cost_per_prompt', 'cost_per_update', 'error',
+]
+
+def load_manifest(path: str) -> List[Tuple[str, str]]:
+    """(name, root) pairs from a JSON list (strings or {"root", "name"} objects) or a
+    text file with one root per line ('#' starts a comment)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if path.endswith(".json"):
+        entries = json.loads(text)
+    else:
+        entries = [line.split("#", 1)[0].strip() for line in text.splitlines()]
+        entries = [entry for entry in entries if entry]
+    repos = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'root': entry}
+        root = entry['root']
+        name = entry.get('name') or os.path.basename(os.path.normpath(root)) or root
+        repos.append((name, root))
+    return repos
+
+def _output_dir_name(name: str, used: set) -> str:
+    base = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("._") or "repo"
+    candidate, n = base, 1
+    while candidate in used:
+        n += 1
+        candidate = f"{base}_{n}"
+    used.add(candidate)
+    return candidate
+
+def _result_row(name: str, root: str, analysis, seconds: float) -> Dict:
+    chunk_analysis = analysis.chunk_analysis
+    return {
+        'repo': name,
+        'root': root,
+        'status': 'ok',
+        'seconds': round(seconds, 3),
+        'files_processed': chunk_analysis['files_processed'],
+        'total_chunks': chunk_analysis['total_chunks'],
+        'total_tokens': chunk_analysis['total_tokens'],
+        'avg_tokens_per_chunk': chunk_analysis['avg_tokens_per_chunk'],
+        'one_time_cost': analysis.phase1_costs['total_one_time'],
+        'monthly_storage_cost': analysis.phase1_costs['total_monthly_storage'],
+        'cost_per_prompt': analysis.phase2_costs['total_per_prompt'],
+        'cost_per_update': analysis.phase3_costs['total_per_update'],
+        'error': '',
+    }
+
+def analyze_repositories(repos: List[Tuple[str, str]], output_dir: str, formats=("markdown", "json"),
+                         workers: int = None, cache: ChunkCache = None, stream: bool = False,
+                         token_mode: str = "exact", bytes_per_token: float = None) -> List[Dict]:
+    """Analyze every repo through one worker pool, writing <output_dir>/<repo>/report.<ext>.
+
+    A failing repo is recorded with status 'error' and the batch moves on; if a worker
+    process dies the pool is replaced before the next repo.
+    """
+    extensions = {"markdown": "md", "latex": "tex", "json": "json"}
+    os.makedirs(output_dir, exist_ok=True)
+    used_names = set()
+    rows = []
+    executor = make_executor(workers) if workers and workers > 1 else None
+    try:
+        for name, root in repos:
+            start = time.perf_counter()
+            repo_dir = os.path.join(output_dir, _output_dir_name(name, used_names))
+            try:
+                if not os.path.isdir(root):
+                    raise FileNotFoundError(f"Repository root not found: {root}")
+                analysis = compute_project_analysis(root, project_name=name, workers=workers, cache=cache,
+                                                    stream=stream, executor=executor, token_mode=token_mode,
+                                                    bytes_per_token=bytes_per_token)
+                os.makedirs(repo_dir, exist_ok=True)
+                for fmt in formats:
+                    with open(os.path.join(repo_dir, f"report.{extensions[fmt]}"), 'w', encoding='utf-8') as f:
+                        f.write(RENDERERS[fmt](analysis))
+                rows.append(_result_row(name, root, analysis, time.perf_counter() - start))
+                print(f"[ok] {name}: {analysis.chunk_analysis['files_processed']:,} files", file=sys.stderr)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool) and executor is not None:
+                    executor.shutdown(cancel_futures=True)
+                    executor = make_executor(workers)
+                row = {column: '' for column in AGGREGATE_COLUMNS}
+                row.update({'repo': name, 'root': root, 'status': 'error',
+                            'seconds': round(time.perf_counter() - start, 3), 'error': f"{type(e).__name__}: {e}"})
+                rows.append(row)
+                os.makedirs(repo_dir, exist_ok=True)
+                with open(os.path.join(repo_dir, "error.txt"), 'w', encoding='utf-8') as f:
+                    f.write(traceback.format_exc())
+                print(f"[error] {name}: {row['error']}", file=sys.stderr)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return rows
+
+def render_aggregate_markdown(rows: List[Dict]) -> str:
+    ok_rows = [row for row in rows if row['status'] == 'ok']
+    lines = [
+        "# Multi-Repository Cost Summary",
+        "",
+        f"- **Repositories**: {len(rows):,} ({len(ok_rows):,} ok, {len(rows) - len(ok_rows):,} failed)",
+        f"- **Total Files**: {sum(row['files_processed'] for row in ok_rows):,}",
+        f"- **Total Chunks**: {sum(row['total_chunks'] for row in ok_rows):,}",
+        f"- **Total Tokens**: {sum(row['total_tokens'] for row in ok_rows):,}",
+        f"- **Total One-Time Cost**: ${sum(row['one_time_cost'] for row in ok_rows):.4f}",
+        f"- **Total Storage/Month**: ${sum(row['monthly_storage_cost'] for row in ok_rows):.4f}",
+        "",
+        "| Repository | Status | Files | Chunks | Tokens | One-Time | Storage/Month | Per Prompt | Per Update |",
+        "|------------|--------|-------|--------|--------|----------|---------------|------------|------------|",
+    ]
+    for row in rows:
+        if row['status'] == 'ok':
+            lines.append(f"| {row['repo']} | ok | {row['files_processed']:,} | {row['total_chunks']:,} | "
+                         f"{row['total_tokens']:,} | ${row['one_time_cost']:.4f} | ${row['monthly_storage_cost']:.4f} | "
+                         f"${row['cost_per_prompt']:.6f} | ${row['cost_per_update']:.6f} |")
+        else:
+            lines.append(f"| {row['repo']} | error | -- | -- | -- | -- | -- | -- | -- |")
+    return "\n".join(lines) + "\n"
+
+def write_aggregate(rows: List[Dict], output_dir: str):
+    with open(os.path.join(output_dir, "aggregate.csv"), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=AGGREGATE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(output_dir, "aggregate.md"), 'w', encoding='utf-8') as f:
+        f.write(render_aggregate_markdown(rows))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze many repositories in one process with a shared worker pool")
+    parser.add_argument("manifest", help="Text file with one repo root per line, or a JSON list")
+    parser.add_argument("--output-dir", "-o", default="batch_results", help="Where per-repo and aggregate results go")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes shared by all repos")
+    parser.add_argument("--format", dest="formats", action="append", choices=OUTPUT_FORMATS,
+                        help="Per-repo report format; repeat for several (default: markdown and json)")
+    parser.add_argument("--stream", action="store_true", help="Stream each repo with bounded memory")
+    parser.add_argument("--token-mode", choices=("exact", "estimate"), default="exact",
+                        help="'estimate' derives token counts from byte length, calibrated per repo")
+    parser.add_argument("--bytes-per-token", type=float, default=None,
+                        help="Fixed ratio for --token-mode estimate instead of per-repo calibration")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the on-disk per-file cache")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="SQLite file for per-file results")
+    parser.add_argument("--cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Evict least recently used files beyond this many cache entries")
+    args = parser.parse_args(argv)
+
+    repos = load_manifest(args.manifest)
+    cache = None if args.no_cache else ChunkCache(args.cache_path, args.cache_max_entries)
+    try:
+        rows = analyze_repositories(repos, args.output_dir, args.formats or ["markdown", "json"],
+                                    workers=args.workers, cache=cache, stream=args.stream,
+                                    token_mode=args.token_mode, bytes_per_token=args.bytes_per_token)
+    finally:
+        if cache is not None:
+            cache.close()
+    write_aggregate(rows, args.output_dir)
+    print(render_aggregate_markdown(rows))
+    if any(row['status'] != 'ok' for row in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import os
+import sys
+import time
+import random
+import shutil
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+import utils
+from chunking import chunk_spans
+from utils import (iter_python_files, get_python_files, decode_source, split_by_ast_nodes,
+                   count_tokens, count_tokens_batch, clear_token_memo)
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+FILES_PER_PACKAGE = 100
+
+def collect_chunk_texts(directory: str, max_files: int = None):
+    """Per-file lists of chunk texts, as split_by_ast_nodes would tokenize them."""
+    per_file = []
+    for i, (file_path, _) in enumerate(iter_python_files(directory)):
+        if max_files is not None and i >= max_files:
+            break
+        with open(file_path, 'rb') as f:
+            source = decode_source(f.read())
+        if source is not None:
+            per_file.append([code for _, _, _, code, _ in chunk_spans(source)])
+    return per_file
+
+def _timed(fn, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_tokenization(directory: str, repeat: int = 3, max_files: int = None) -> list:
+    per_file = collect_chunk_texts(directory, max_files)
+    n_chunks = sum(len(texts) for texts in per_file)
+
+    def per_call():
+        return sum(count_tokens(text) for texts in per_file for text in texts)
+
+    def memo_cold():
+        clear_token_memo()
+        return sum(sum(count_tokens_batch(texts)) for texts in per_file)
+
+    def memo_warm():
+        return sum(sum(count_tokens_batch(texts)) for texts in per_file)
+
+    rows = []
+    baseline_time = None
+    for name, fn in (("per-call encode", per_call), ("memoized, cold", memo_cold), ("memoized, warm", memo_warm)):
+        elapsed, tokens = _timed(fn, repeat)
+        baseline_time = baseline_time or elapsed
+        rows.append({
+            'path': name,
+            'seconds': elapsed,
+            'chunks_per_sec': n_chunks / elapsed if elapsed else 0,
+            'tokens': tokens,
+            'speedup': baseline_time / elapsed if elapsed else 0,
+        })
+    return rows
+
+def print_rows(rows: list):
+    print(f"| {'Path':<22} | {'Seconds':>9} | {'Chunks/sec':>12} | {'Tokens':>12} | {'Speedup':>7} |")
+    print(f"|{'-' * 24}|{'-' * 11}|{'-' * 14}|{'-' * 14}|{'-' * 9}|")
+    for row in rows:
+        print(f"| {row['path']:<22} | {row['seconds']:>9.3f} | {row['chunks_per_sec']:>12,.0f} | "
+              f"{row['tokens']:>12,} | {row['speedup']:>6.2f}x |")
+
+def _synthetic_module(rng: random.Random, index: int) -> str:
+    lines = ["import os", "import sys", "from typing import List, Dict, Optional", ""]
+    lines.append(f"CONSTANT_{index} = {rng.randint(0, 10_000)}")
+    lines.append("")
+    for c in range(rng.randint(0, 3)):
+        lines.append(f"class Model{index}_{c}:")
+        lines.append(f'    """Synthetic model {c} in module {index}."""')
+        lines.append("    def __init__(self, value: int = 0):")
+        lines.append("        self.value = value")
+        lines.append("        self.items: List[int] = []")
+        for m in range(rng.randint(1, 6)):
+            lines.append(f"    def method_{m}(self, x: int) -> int:")
+            for k in range(rng.randint(1, 8)):
+                lines.append(f"        x = (x * {rng.randint(2, 97)} + self.value) % {rng.randint(100, 10_000)}")
+            lines.append("        return x")
+        lines.append("")
+    for f in range(rng.randint(1, 5)):
+        lines.append(f"def helper_{index}_{f}(values: List[int]) -> Dict[str, int]:")
+        lines.append("    result = {}")
+        lines.append("    for i, value in enumerate(values):")
+        for k in range(rng.randint(1, 10)):
+            lines.append(f"        result['key_{k}_' + str(i)] = value + {rng.randint(0, 1000)}")
+        lines.append("    return result")
+        lines.append("")
+    return "\n".join(lines)
+
+def generate_synthetic_tree(root: str, n_files: int, seed: int = 0) -> str:
+    """Write n_files deterministic Python modules under root, FILES_PER_PACKAGE per package."""
+    marker = os.path.join(root, ".synthetic")
+    expected = f"{n_files}:{seed}"
+    if os.path.isfile(marker):
+        with open(marker) as f:
+            if f.read() == expected:
+                return root
+        shutil.rmtree(root)
+    rng = random.Random(seed)
+    for i in range(n_files):
+        package = os.path.join(root, f"pkg_{i // FILES_PER_PACKAGE:05d}")
+        if i % FILES_PER_PACKAGE == 0:
+            os.makedirs(package, exist_ok=True)
+        with open(os.path.join(package, f"mod_{i:06d}.py"), 'w', encoding='utf-8') as f:
+            f.write(_synthetic_module(rng, i))
+    with open(marker, 'w') as f:
+        f.write(expected)
+    return root
+
+def _peak_rss_mb() -> float:
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _read_source(file_path: str) -> str:
+    with open(file_path, 'rb') as f:
+        return decode_source(f.read()) or ""
+
+def _stage_get_python_files(root: str, workers: int):
+    start = time.perf_counter()
+    files, _ = get_python_files(root)
+    return len(files), 0, time.perf_counter() - start
+
+def _stage_split_by_ast_nodes(root: str, workers: int):
+    files, _ = get_python_files(root)
+    tokens = 0
+    start = time.perf_counter()
+    for file_path in files:
+        tokens += sum(chunk['token_count'] for chunk in split_by_ast_nodes(_read_source(file_path)))
+    return len(files), tokens, time.perf_counter() - start
+
+def _stage_count_tokens(root: str, workers: int):
+    files, _ = get_python_files(root)
+    tokens = 0
+    elapsed = 0.0
+    for file_path in files:
+        texts = [code for _, _, _, code, _ in chunk_spans(_read_source(file_path))]
+        start = time.perf_counter()
+        tokens += sum(count_tokens(text) for text in texts)
+        elapsed += time.perf_counter() - start
+    return len(files), tokens, elapsed
+
+def _stage_analyze_project(root: str, workers: int):
+    from combined_analyzer import compute_project_analysis, render_markdown
+    start = time.perf_counter()
+    analysis = compute_project_analysis(root, workers=workers)
+    render_markdown(analysis)
+    elapsed = time.perf_counter() - start
+    return analysis.chunk_analysis['files_processed'], analysis.chunk_analysis['total_tokens'], elapsed
+
+SCALE_STAGES = {
+    "get_python_files": _stage_get_python_files,
+    "split_by_ast_nodes": _stage_split_by_ast_nodes,
+    "count_tokens": _stage_count_tokens,
+    "analyze_project": _stage_analyze_project,
+}
+
+def _run_stage(stage: str, root: str, workers: int) -> dict:
+    files, tokens, seconds = SCALE_STAGES[stage](root, workers)
+    return {'stage': stage, 'files': files, 'tokens': tokens, 'seconds': seconds, 'peak_rss_mb': _peak_rss_mb()}
+
+def bench_scale(sizes=DEFAULT_SIZES, stages=tuple(SCALE_STAGES), workers: int = None, tree_dir: str = None,
+                seed: int = 0) -> list:
+    """Run each stage in a fresh process per tree size so peak RSS is per stage."""
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    # Generated trees are removed even if a stage fails; a caller's tree_dir is kept
+    with (nullcontext(tree_dir) if tree_dir else tempfile.TemporaryDirectory(prefix="code_analyzer_bench_")) as base_dir:
+        for n_files in sizes:
+            root = generate_synthetic_tree(os.path.join(base_dir, f"tree_{n_files}"), n_files, seed)
+            for stage in stages:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    row = executor.submit(_run_stage, stage, root, workers).result()
+                row['size'] = n_files
+                row['files_per_sec'] = row['files'] / row['seconds'] if row['seconds'] else 0
+                row['tokens_per_sec'] = row['tokens'] / row['seconds'] if row['seconds'] else 0
+                rows.append(row)
+    return rows
+
+def print_scale_rows(rows: list):
+    print("| Files | Stage | Seconds | Files/sec | Tokens/sec | Peak RSS (MB) |")
+    print("|-------|-------|---------|-----------|------------|---------------|")
+    for row in rows:
+        print(f"| {row['size']:,} | {row['stage']} | {row['seconds']:.3f} | {row['files_per_sec']:,.0f} | "
+              f"{row['tokens_per_sec']:,.0f} | {row['peak_rss_mb']:.1f} |")
+
+def bench_chunking(directory: str, workers_options=(1, os.cpu_count() or 1), chunk_config: dict = None) -> list:
+    """astchunk throughput of split_chunk.iter_file_chunks, serial vs process pool."""
+    from split_chunk import iter_file_chunks
+    rows = []
+    baseline_time = None
+    for workers in workers_options:
+        start = time.perf_counter()
+        files = chunks = 0
+        for _, _, file_chunks in iter_file_chunks(directory, chunk_config, workers):
+            files += 1
+            chunks += len(file_chunks)
+        elapsed = time.perf_counter() - start
+        baseline_time = baseline_time or elapsed
+        rows.append({
+            'workers': workers,
+            'seconds': elapsed,
+            'files_per_sec': files / elapsed if elapsed else 0,
+            'chunks_per_sec': chunks / elapsed if elapsed else 0,
+            'chunks': chunks,
+            'speedup': baseline_time / elapsed if elapsed else 0,
+        })
+    return rows
+
+def print_chunking_rows(rows: list):
+    print("| Workers | Seconds | Files/sec | Chunks/sec | Chunks | Speedup |")
+    print("|---------|---------|-----------|------------|--------|---------|")
+    for row in rows:
+        print(f"| {row['workers']} | {row['seconds']:.3f} | {row['files_per_sec']:,.0f} | "
+              f"{row['chunks_per_sec']:,.0f} | {row['chunks']:,} | {row['speedup']:.2f}x |")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analyzer's hot paths")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    tokenize_parser = subparsers.add_parser("tokenize", help="Per-call vs memoized count_tokens_batch tokenization on an existing tree")
+    tokenize_parser.add_argument("directory", nargs="?", default=".", help="Python tree to benchmark against")
+    tokenize_parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is reported")
+    tokenize_parser.add_argument("--max-files", type=int, default=None, help="Only use the first N files")
+    tokenize_parser.add_argument("--memo-size", type=int, default=utils.TOKEN_MEMO_SIZE, help="Token memo capacity")
+
+    scale_parser = subparsers.add_parser("scale", help="Stage throughput and peak RSS on synthetic trees")
+    scale_parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                              help="Comma-separated synthetic tree sizes in files")
+    scale_parser.add_argument("--stages", default=",".join(SCALE_STAGES),
+                              help=f"Comma-separated stages from: {', '.join(SCALE_STAGES)}")
+    scale_parser.add_argument("--workers", type=int, default=None, help="Worker processes for analyze_project")
+    scale_parser.add_argument("--tree-dir", default=None,
+                              help="Keep generated trees here and reuse them across runs (default: temporary)")
+    scale_parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic tree generator")
+    chunking_parser = subparsers.add_parser("chunking", help="Serial vs parallel astchunk chunking throughput")
+    chunking_parser.add_argument("directory", nargs="?", default=None,
+                                 help="Python tree to chunk (default: a generated synthetic tree)")
+    chunking_parser.add_argument("--files", type=int, default=1_000, help="Synthetic tree size when no directory is given")
+    chunking_parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}",
+                                 help="Comma-separated worker counts to compare; the first is the baseline")
+    chunking_parser.add_argument("--max-chunk-size", type=int, default=None, help="Override astchunk max_chunk_size")
+    args = parser.parse_args(argv)
+
+    if args.command == "chunking":
+        workers_options = [int(workers) for workers in args.workers.split(",")]
+        chunk_config = {"max_chunk_size": args.max_chunk_size} if args.max_chunk_size else None
+        if args.directory is not None:
+            print_chunking_rows(bench_chunking(args.directory, workers_options, chunk_config))
+        else:
+            with tempfile.TemporaryDirectory(prefix="code_analyzer_bench_") as base_dir:
+                root = generate_synthetic_tree(os.path.join(base_dir, "tree"), args.files)
+                print_chunking_rows(bench_chunking(root, workers_options, chunk_config))
+    elif args.command == "tokenize":
+        utils.TOKEN_MEMO_SIZE = args.memo_size
+        if not os.path.isdir(args.directory):
+            sys.exit(f"Not a directory: {args.directory}")
+        print(f"Tokenization benchmark on {args.directory}")
+        print_rows(bench_tokenization(args.directory, args.repeat, args.max_files))
+    else:
+        stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+        unknown = [stage for stage in stages if stage not in SCALE_STAGES]
+        if unknown:
+            sys.exit(f"Unknown stage(s): {', '.join(unknown)}")
+        sizes = [int(size) for size in args.sizes.split(",")]
+        print_scale_rows(bench_scale(sizes, stages, args.workers, args.tree_dir, args.seed))
+
+if __name__ == "__main__":
+    main()
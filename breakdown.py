@@ -0,0 +1,233 @@
+import os
+import sys
+import csv
+import json
+import argparse
+from array import array
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from chunking import CHUNKERS, DEFAULT_CHUNKER
+from utils import analyze_chunks_average
+
+BREAKDOWN_JSON = "breakdown.json"
+FILES_CSV = "files.csv"
+CHUNKS_CSV = "chunks.csv"
+DIRECTORIES_CSV = "directories.csv"
+
+class FileRow(NamedTuple):
+    path: str
+    size: int
+    chunks: int
+    tokens: int
+
+class ChunkRow(NamedTuple):
+    path: str
+    node_type: str
+    start_line: int
+    end_line: int
+    tokens: int
+
+class DirectoryRow(NamedTuple):
+    path: str
+    files: int
+    chunks: int
+    tokens: int
+    size: int
+
+class ScanBreakdown:
+    """Per-file and per-chunk results of one scan, kept as typed columns.
+
+    A chunk costs five array slots (about 34 bytes on 64-bit Linux: four 'L' columns and
+    one 'H') instead of a dict, so million-chunk repos stay small in memory and in the
+    columnar JSON. Rows are materialized as
+    FileRow/ChunkRow tuples only while iterating.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        # Repo-wide totals from analyze_chunks_average, when the breakdown came from a scan
+        self.totals: Optional[Dict] = None
+        self.paths: List[str] = []
+        self.file_sizes = array('Q')
+        self.file_chunks = array('L')
+        self.file_tokens = array('Q')
+        self.node_types: List[str] = []
+        self._node_type_ids: Dict[str, int] = {}
+        self.chunk_files = array('L')
+        self.chunk_types = array('H')
+        self.chunk_starts = array('L')
+        self.chunk_ends = array('L')
+        self.chunk_tokens = array('L')
+
+    def _node_type_id(self, node_type: str) -> int:
+        type_id = self._node_type_ids.get(node_type)
+        if type_id is None:
+            type_id = self._node_type_ids[node_type] = len(self.node_types)
+            self.node_types.append(node_type)
+        return type_id
+
+    def add_file(self, file_path: str, size: int, chunk_rows: list):
+        """Record one file; chunk_rows are utils.ChunkStat (start_line, end_line, node_type, tokens) tuples."""
+        file_id = len(self.paths)
+        self.paths.append(os.path.relpath(file_path, self.root).replace(os.sep, "/"))
+        self.file_sizes.append(size)
+        self.file_chunks.append(len(chunk_rows))
+        self.file_tokens.append(sum(row[3] for row in chunk_rows))
+        for start_line, end_line, node_type, tokens in chunk_rows:
+            self.chunk_files.append(file_id)
+            self.chunk_types.append(self._node_type_id(node_type))
+            self.chunk_starts.append(start_line)
+            self.chunk_ends.append(end_line)
+            self.chunk_tokens.append(tokens)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.chunk_tokens)
+
+    def iter_files(self) -> Iterator[FileRow]:
+        for row in zip(self.paths, self.file_sizes, self.file_chunks, self.file_tokens):
+            yield FileRow(*row)
+
+    def iter_chunks(self) -> Iterator[ChunkRow]:
+        for file_id, type_id, start_line, end_line, tokens in zip(self.chunk_files, self.chunk_types, self.chunk_starts,
+                                                                  self.chunk_ends, self.chunk_tokens):
+            yield ChunkRow(self.paths[file_id], self.node_types[type_id], start_line, end_line, tokens)
+
+    def directory_rollup(self, max_depth: Optional[int] = None) -> List[DirectoryRow]:
+        """Totals for every directory, each including its whole subtree ("." is the root)."""
+        totals: Dict[str, List[int]] = {}
+        for path, size, chunks, tokens in zip(self.paths, self.file_sizes, self.file_chunks, self.file_tokens):
+            parts = path.split("/")[:-1]
+            if max_depth is not None:
+                parts = parts[:max_depth]
+            for depth in range(len(parts) + 1):
+                entry = totals.setdefault("/".join(parts[:depth]) or ".", [0, 0, 0, 0])
+                entry[0] += 1
+                entry[1] += chunks
+                entry[2] += tokens
+                entry[3] += size
+        return [DirectoryRow(path, *entry) for path, entry in sorted(totals.items())]
+
+    def top_files(self, n: int = 10, key: str = "tokens") -> List[FileRow]:
+        return sorted(self.iter_files(), key=lambda row: getattr(row, key), reverse=True)[:n]
+
+    def to_dict(self) -> Dict:
+        return {
+            'root': self.root,
+            'totals': self.totals,
+            'node_types': self.node_types,
+            'files': {
+                'path': self.paths,
+                'size': self.file_sizes.tolist(),
+                'chunks': self.file_chunks.tolist(),
+                'tokens': self.file_tokens.tolist(),
+            },
+            'chunks': {
+                'file': self.chunk_files.tolist(),
+                'node_type': self.chunk_types.tolist(),
+                'start_line': self.chunk_starts.tolist(),
+                'end_line': self.chunk_ends.tolist(),
+                'tokens': self.chunk_tokens.tolist(),
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ScanBreakdown":
+        breakdown = cls(data['root'])
+        breakdown.totals = data.get('totals')
+        breakdown.paths = list(data['files']['path'])
+        breakdown.file_sizes = array('Q', data['files']['size'])
+        breakdown.file_chunks = array('L', data['files']['chunks'])
+        breakdown.file_tokens = array('Q', data['files']['tokens'])
+        breakdown.node_types = list(data['node_types'])
+        breakdown._node_type_ids = {node_type: i for i, node_type in enumerate(breakdown.node_types)}
+        breakdown.chunk_files = array('L', data['chunks']['file'])
+        breakdown.chunk_types = array('H', data['chunks']['node_type'])
+        breakdown.chunk_starts = array('L', data['chunks']['start_line'])
+        breakdown.chunk_ends = array('L', data['chunks']['end_line'])
+        breakdown.chunk_tokens = array('L', data['chunks']['tokens'])
+        return breakdown
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> "ScanBreakdown":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def write_csv(self, output_dir: str, max_depth: Optional[int] = None):
+        """files.csv, chunks.csv and directories.csv under output_dir."""
+        os.makedirs(output_dir, exist_ok=True)
+        tables = ((FILES_CSV, FileRow, self.iter_files()), (CHUNKS_CSV, ChunkRow, self.iter_chunks()),
+                  (DIRECTORIES_CSV, DirectoryRow, self.directory_rollup(max_depth)))
+        for name, row_type, rows in tables:
+            with open(os.path.join(output_dir, name), 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(row_type._fields)
+                writer.writerows(rows)
+
+    def write(self, output_dir: str, max_depth: Optional[int] = None):
+        os.makedirs(output_dir, exist_ok=True)
+        self.save(os.path.join(output_dir, BREAKDOWN_JSON))
+        self.write_csv(output_dir, max_depth)
+
+def scan_breakdown(directory: str, **scan_options) -> ScanBreakdown:
+    """Scan directory once, collecting the per-file/per-chunk breakdown. scan_options go to
+    analyze_chunks_average, whose totals are stored as `totals`."""
+    breakdown = ScanBreakdown(directory)
+    breakdown.totals = analyze_chunks_average(directory, breakdown=breakdown, **scan_options)
+    return breakdown
+
+def render_markdown(breakdown: ScanBreakdown, top: int = 10, max_depth: Optional[int] = 1) -> str:
+    total_tokens = sum(breakdown.file_tokens)
+    lines = [
+        "| Directory | Files | Chunks | Tokens | Share |",
+        "|-----------|-------|--------|--------|-------|",
+    ]
+    for row in sorted(breakdown.directory_rollup(max_depth), key=lambda row: row.tokens, reverse=True)[:top]:
+        share = row.tokens / total_tokens * 100 if total_tokens else 0
+        lines.append(f"| {row.path} | {row.files:,} | {row.chunks:,} | {row.tokens:,} | {share:.1f}% |")
+    lines += [
+        "",
+        "| File | Chunks | Tokens | Share |",
+        "|------|--------|--------|-------|",
+    ]
+    for row in breakdown.top_files(top):
+        share = row.tokens / total_tokens * 100 if total_tokens else 0
+        lines.append(f"| {row.path} | {row.chunks:,} | {row.tokens:,} | {share:.1f}% |")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-file, per-chunk and per-directory token breakdown")
+    parser.add_argument("directory", nargs="?", default=".", help="Project root to scan")
+    parser.add_argument("--from", dest="load_path", default=None,
+                        help=f"Read a saved {BREAKDOWN_JSON} instead of scanning")
+    parser.add_argument("--output-dir", "-o", default=None,
+                        help=f"Write {BREAKDOWN_JSON}, {FILES_CSV}, {CHUNKS_CSV} and {DIRECTORIES_CSV} here")
+    parser.add_argument("--depth", type=int, default=None,
+                        help="Deepest directory level in the rollups (default: all; the summary uses 1)")
+    parser.add_argument("--top", type=int, default=10, help="Rows in the printed summary")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for chunking/tokenization")
+    parser.add_argument("--chunker", choices=CHUNKERS, default=DEFAULT_CHUNKER, help="Chunking strategy")
+    parser.add_argument("--token-mode", choices=("exact", "estimate"), default="exact",
+                        help="'estimate' derives token counts from byte length")
+    args = parser.parse_args(argv)
+
+    if args.load_path:
+        breakdown = ScanBreakdown.load(args.load_path)
+    else:
+        breakdown = scan_breakdown(args.directory, workers=args.workers, chunker=args.chunker,
+                                   token_mode=args.token_mode)
+    if args.output_dir:
+        breakdown.write(args.output_dir, args.depth)
+        print(f"Wrote {len(breakdown):,} files and {breakdown.chunk_count:,} chunks to {args.output_dir}",
+              file=sys.stderr)
+    print(render_markdown(breakdown, args.top, args.depth if args.depth is not None else 1))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+import time
+import sqlite3
+import hashlib
+from typing import Optional, Tuple
+
+DEFAULT_CACHE_PATH = ".code_analyzer_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 500_000
+# Buffered writes are sent to SQLite once this many accumulate
+WRITE_BATCH = 10_000
+
+def content_digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+class ChunkCache:
+    """SQLite store of per-file chunk/token counts keyed by path and content hash.
+
+    A matching mtime/size is trusted as-is; otherwise the file is re-read and its
+    content hash compared, so touched-but-unchanged files are still hits. The
+    namespace separates results produced by different chunkers/tokenizers.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pending = []
+        self._touched = []
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS file_stats (
+            namespace TEXT NOT NULL,
+            path TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            digest BLOB NOT NULL,
+            chunks INTEGER NOT NULL,
+            tokens INTEGER NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (namespace, path)
+        )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS file_stats_last_used ON file_stats (last_used)")
+        self._conn.commit()
+
+    def lookup(self, namespace: str, file_path: str, st: os.stat_result) -> Optional[Tuple[int, int]]:
+        key = os.path.abspath(file_path)
+        row = self._conn.execute(
+            "SELECT mtime_ns, size, digest, chunks, tokens FROM file_stats WHERE namespace = ? AND path = ?",
+            (namespace, key)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        mtime_ns, size, digest, chunks, tokens = row
+        if mtime_ns != st.st_mtime_ns or size != st.st_size:
+            try:
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                self.misses += 1
+                return None
+            if content_digest(data) != digest:
+                self.misses += 1
+                return None
+            self._pending.append((namespace, key, st.st_mtime_ns, st.st_size, digest, chunks, tokens, time.time()))
+        else:
+            self._touched.append((time.time(), namespace, key))
+        if len(self._pending) + len(self._touched) >= WRITE_BATCH:
+            self._write_buffered()
+        self.hits += 1
+        return chunks, tokens
+
+    def store(self, namespace: str, file_path: str, st: os.stat_result, digest: bytes, chunks: int, tokens: int):
+        self._pending.append((namespace, os.path.abspath(file_path), st.st_mtime_ns, st.st_size,
+                              digest, chunks, tokens, time.time()))
+        if len(self._pending) >= WRITE_BATCH:
+            self._write_buffered()
+
+    def _write_buffered(self):
+        if self._pending:
+            self._conn.executemany("INSERT OR REPLACE INTO file_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._pending)
+        if self._touched:
+            self._conn.executemany("UPDATE file_stats SET last_used = ? WHERE namespace = ? AND path = ?", self._touched)
+        self._pending = []
+        self._touched = []
+
+    def flush(self):
+        self._write_buffered()
+        self._evict()
+        self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM file_stats").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM file_stats WHERE rowid IN (SELECT rowid FROM file_stats ORDER BY last_used LIMIT ?)",
+                (excess,))
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
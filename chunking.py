@@ -0,0 +1,140 @@
+import ast
+import bisect
+from typing import AnyStr, Dict, Iterator, List, Optional, Tuple
+
+from profiling import PROFILER
+
+# "ast" is the original estimator: every FunctionDef/ClassDef found by ast.walk, so nested
+# definitions are also counted inside their parents. "ast-flat" keeps only the outermost
+# definitions, and "astchunk" uses the same ASTChunkBuilder chunks that split_chunk exports.
+# Both of those are non-overlapping.
+CHUNKERS = ("ast", "ast-flat", "astchunk")
+DEFAULT_CHUNKER = "ast"
+
+DEFAULT_CHUNK_CONFIG = {
+    "max_chunk_size": 100,  # Maximum non-whitespace characters per chunk
+    "language": "python",  # Supported: python, java, csharp, typescript
+    "metadata_template": "default"  # Metadata format for output
+}
+
+# (start_line, end_line, node_type, code, astchunk metadata or None); lines are 1-based
+ChunkSpan = Tuple[int, int, str, str, Optional[Dict]]
+
+_DEFINITION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+_chunk_builders = {}
+
+def resolve_chunk_config(chunk_config: Optional[Dict] = None) -> Dict:
+    return dict(DEFAULT_CHUNK_CONFIG, **(chunk_config or {}))
+
+def chunker_key(chunker: str = DEFAULT_CHUNKER, chunk_config: Optional[Dict] = None) -> str:
+    """Stable name for a chunker and its settings, used to keep cached results apart."""
+    if chunker != "astchunk":
+        return chunker
+    config = resolve_chunk_config(chunk_config)
+    return "astchunk(" + ",".join(f"{key}={config[key]}" for key in sorted(config)) + ")"
+
+def get_chunk_builder(chunk_config: Optional[Dict] = None):
+    # One ASTChunkBuilder per process and config; astchunk is only imported when used
+    config = resolve_chunk_config(chunk_config)
+    key = tuple(sorted(config.items()))
+    builder = _chunk_builders.get(key)
+    if builder is None:
+        from astchunk import ASTChunkBuilder
+        builder = _chunk_builders[key] = ASTChunkBuilder(**config)
+    return builder
+
+def _iter_outermost_definitions(node: ast.AST) -> Iterator[ast.AST]:
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, _DEFINITION_NODES):
+            yield child
+        else:
+            yield from _iter_outermost_definitions(child)
+
+class ChunkLocator:
+    """Finds chunk text in its source (str, or the encoded bytes for byte offsets).
+
+    Chunks are looked up in order: each search starts where the previous match ended,
+    or at a given line, and falls back to the whole text.
+    """
+
+    def __init__(self, text: AnyStr):
+        self.text = text
+        self.line_starts = [0]
+        for line in text.splitlines(keepends=True):
+            self.line_starts.append(self.line_starts[-1] + len(line))
+        self.search_from = 0
+
+    def find(self, content: AnyStr, line: Optional[int] = None) -> int:
+        """Offset of content in the text, or -1; line (0-based) moves the search start there."""
+        if line is not None:
+            self.search_from = self.line_starts[min(max(line, 0), len(self.line_starts) - 1)]
+        position = self.text.find(content, self.search_from)
+        if position < 0:
+            position = self.text.find(content)
+        if position >= 0:
+            self.search_from = position + len(content)
+        return position
+
+    def line_of(self, position: int) -> int:
+        """1-based line holding the offset, clamped to the last line."""
+        return min(bisect.bisect_right(self.line_starts, position), max(len(self.line_starts) - 1, 1))
+
+def _astchunk_spans(source: str, chunks: List[Dict]) -> List[ChunkSpan]:
+    # Line numbers come from the metadata when the template has them; otherwise (e.g.
+    # metadata_template "none") from where the chunk text sits in the source
+    locator = ChunkLocator(source)
+    spans = []
+    for chunk in chunks:
+        content = chunk['content']
+        metadata = chunk.get('metadata') or {}
+        if 'start_line_no' in metadata and 'end_line_no' in metadata:
+            start_line, end_line = metadata['start_line_no'] + 1, metadata['end_line_no'] + 1
+        else:
+            position = locator.find(content)
+            if position < 0:
+                position = locator.search_from
+            start_line = locator.line_of(position)
+            end_line = max(start_line, locator.line_of(position + len(content) - 1))
+        spans.append((start_line, end_line, "astchunk", content, metadata))
+    return spans
+
+def chunk_spans(source: str, chunker: str = DEFAULT_CHUNKER, chunk_config: Optional[Dict] = None) -> List[ChunkSpan]:
+    """Parse source once and return its chunks with the selected chunker."""
+    if chunker == "astchunk":
+        with PROFILER.stage("parse"):
+            chunks = get_chunk_builder(chunk_config).chunkify(source)
+        return _astchunk_spans(source, chunks)
+    if chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunker: {chunker!r}")
+
+    with PROFILER.stage("parse"):
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            return []
+    if chunker == "ast-flat":
+        nodes = _iter_outermost_definitions(tree)
+    else:
+        nodes = (node for node in ast.walk(tree) if isinstance(node, _DEFINITION_NODES))
+    lines = source.splitlines()
+    spans = []
+    for node in nodes:
+        start_line = node.lineno - 1
+        end_line = max(getattr(node, 'end_lineno', start_line + 1), start_line + 1)
+        chunk_lines = lines[start_line:end_line]
+        spans.append((start_line + 1, end_line, type(node).__name__, "\n".join(chunk_lines), None))
+    return spans
+
+def export_chunks(spans: List[ChunkSpan], token_counts: List[int]) -> List[Dict]:
+    """Chunk dicts in astchunk's {'content', 'metadata'} shape, with token counts attached."""
+    chunks = []
+    for (start_line, end_line, node_type, code, metadata), token_count in zip(spans, token_counts):
+        if metadata is None:
+            metadata = {
+                'start_line_no': start_line - 1,
+                'end_line_no': end_line - 1,
+                'line_count': end_line - start_line + 1,
+                'node_type': node_type,
+            }
+        chunks.append({'content': code, 'metadata': dict(metadata, token_count=token_count)})
+    return chunks
@@ -1,32 +1,104 @@
 from cost_constants import *
-from utils import analyze_chunks_average
+from utils import IO_THREADS, analyze_chunks_average
+from chunk_cache import ChunkCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES
+from incremental import analyze_since, DEFAULT_SNAPSHOT_PATH
+from profiling import PROFILER
+from chunking import CHUNKERS, DEFAULT_CHUNKER, DEFAULT_CHUNK_CONFIG
+from split_chunk import ChunkExportWriter
+from breakdown import ScanBreakdown
 from cost_calculations import calculate_phase1_costs, calculate_phase2_costs, calculate_phase3_costs, calculate_cost
 
 import os
+import sys
+import json
+import argparse
+from dataclasses import dataclass
+
+OUTPUT_FORMATS = ("markdown", "latex", "json")
+
+@dataclass
+class ProjectAnalysis:
+    """One scan's chunk statistics and derived costs, shared by every renderer"""
+    project_root: str
+    project_name: str
+    entry_file: str
+    chunk_analysis: dict
+    phase1_costs: dict
+    phase2_costs: dict
+    phase3_costs: dict
+
+    @property
+    def avg_chunk_tokens(self) -> float:
+        return self.chunk_analysis['avg_tokens_per_chunk']
+
+    @property
+    def avg_tokens_per_file(self) -> float:
+        files_processed = self.chunk_analysis['files_processed']
+        return self.chunk_analysis['total_tokens'] / files_processed if files_processed > 0 else 0
+
+def _resolve_entry_file(project_root: str) -> str:
+    entry_file = os.path.join(project_root, "__init__.py")
+    if os.path.isfile(entry_file):
+        return entry_file
+    for root, _, files in os.walk(project_root):
+        for file in files:
+            if file.endswith(".py"):
+                return os.path.join(root, file)
+    return ""
+
+def _phase3_costs(chunk_analysis: dict) -> dict:
+    avg_chunk_tokens = chunk_analysis['avg_tokens_per_chunk']
+    if 'files_changed' in chunk_analysis:
+        # Incremental run: price the chunks that actually changed
+        affected_chunks = chunk_analysis['affected_chunks']
+        changed_chunk_tokens = chunk_analysis['affected_tokens'] / affected_chunks if affected_chunks > 0 else 0
+        return calculate_phase3_costs(files_changed=chunk_analysis['files_changed'],
+                                      avg_chunk_tokens=changed_chunk_tokens, affected_chunks=affected_chunks)
+    files_processed = chunk_analysis['files_processed']
+    avg_chunks_per_file = chunk_analysis['total_chunks'] / files_processed if files_processed > 0 else 0
+    return calculate_phase3_costs(avg_chunks_per_file=avg_chunks_per_file, avg_chunk_tokens=avg_chunk_tokens)
 
-def analyze_project_latex(project_root: str, entry_file: str = None, project_name: str = None) -> str:
-    """Generate LaTeX table format for cost breakdown"""
+def build_project_analysis(project_root: str, chunk_analysis: dict, entry_file: str = None,
+                           project_name: str = None) -> ProjectAnalysis:
+    """Cost phases for chunk statistics that are already known (no scan)."""
     if project_name is None:
         project_name = os.path.basename(project_root).upper()
-
     if entry_file is None:
-        entry_file = os.path.join(project_root, "__init__.py")
-        if not os.path.isfile(entry_file):
-            python_files = []
-            for root, _, files in os.walk(project_root):
-                for file in files:
-                    if file.endswith(".py"):
-                        python_files.append(os.path.join(root, file))
-            entry_file = python_files[0] if python_files else ""
-
-    chunk_analysis = analyze_chunks_average(project_root)
+        entry_file = _resolve_entry_file(project_root)
     avg_chunk_tokens = chunk_analysis['avg_tokens_per_chunk']
-    total_tokens = chunk_analysis['total_tokens']
-    files_processed = chunk_analysis['files_processed']
-    avg_tokens_per_file = total_tokens / files_processed if files_processed > 0 else 0
-
-    phase1_costs = calculate_phase1_costs(chunk_analysis)
-    phase2_costs = calculate_phase2_costs(avg_chunk_tokens=avg_chunk_tokens)
+    return ProjectAnalysis(
+        project_root=project_root,
+        project_name=project_name,
+        entry_file=entry_file,
+        chunk_analysis=chunk_analysis,
+        phase1_costs=calculate_phase1_costs(chunk_analysis),
+        phase2_costs=calculate_phase2_costs(avg_chunk_tokens=avg_chunk_tokens),
+        phase3_costs=_phase3_costs(chunk_analysis),
+    )
+
+def compute_project_analysis(project_root: str, entry_file: str = None, project_name: str = None,
+                             since: str = None, snapshot_path: str = DEFAULT_SNAPSHOT_PATH, **scan_options) -> ProjectAnalysis:
+    """Scan the project once and compute all cost phases.
+
+    ``scan_options`` (workers, cache, stream, progress, ...) go to analyze_chunks_average.
+    With ``since`` only files changed since that git ref are re-chunked, on top of the
+    per-file snapshot at ``snapshot_path``.
+    """
+    with PROFILER.stage("scan"):
+        if since is not None:
+            chunk_analysis = analyze_since(project_root, since, snapshot_path, workers=scan_options.get('workers'),
+                                           cache=scan_options.get('cache'), stream=scan_options.get('stream', False))
+        else:
+            chunk_analysis = analyze_chunks_average(project_root, **scan_options)
+    return build_project_analysis(project_root, chunk_analysis, entry_file, project_name)
+
+def render_latex(analysis: ProjectAnalysis) -> str:
+    """Generate LaTeX table format for cost breakdown"""
+    project_name = analysis.project_name
+    avg_chunk_tokens = analysis.avg_chunk_tokens
+    avg_tokens_per_file = analysis.avg_tokens_per_file
+    phase1_costs = analysis.phase1_costs
+    phase2_costs = analysis.phase2_costs
 
     # Baseline strategy: use same calculation as Strategy 3 in markdown section
     # Strategy 3: Input = avg file tokens + 2x avg chunk tokens, Output = 1x avg chunk tokens
@@ -74,27 +146,16 @@ Parsing Cost & -- & -- & {parsing_cost:.4f} \\\\
 
     return latex_output
 
-def analyze_project_comprehensive(project_root: str, entry_file: str = None) -> str:
-    if entry_file is None:
-        entry_file = os.path.join(project_root, "__init__.py")
-        if not os.path.isfile(entry_file):
-            python_files = []
-            for root, _, files in os.walk(project_root):
-                for file in files:
-                    if file.endswith(".py"):
-                        python_files.append(os.path.join(root, file))
-            entry_file = python_files[0] if python_files else ""
-
-    chunk_analysis = analyze_chunks_average(project_root)
-    avg_chunk_tokens = chunk_analysis['avg_tokens_per_chunk']
-    total_tokens = chunk_analysis['total_tokens']
-    files_processed = chunk_analysis['files_processed']
-    avg_tokens_per_file = total_tokens / files_processed if files_processed > 0 else 0
-    avg_tokens_per_project = total_tokens
+def render_markdown(analysis: ProjectAnalysis) -> str:
+    """Generate the comprehensive markdown cost breakdown"""
+    chunk_analysis = analysis.chunk_analysis
+    avg_chunk_tokens = analysis.avg_chunk_tokens
+    avg_tokens_per_file = analysis.avg_tokens_per_file
+    avg_tokens_per_project = chunk_analysis['total_tokens']
 
-    phase1_costs = calculate_phase1_costs(chunk_analysis)
-    phase2_costs = calculate_phase2_costs(avg_chunk_tokens=avg_chunk_tokens)
-    phase3_costs = calculate_phase3_costs(avg_chunk_tokens=avg_chunk_tokens)
+    phase1_costs = analysis.phase1_costs
+    phase2_costs = analysis.phase2_costs
+    phase3_costs = analysis.phase3_costs
     storage = phase1_costs['storage_details']
 
     strategy1_input_cost = calculate_cost(avg_tokens_per_file, CLAUDE_INPUT_COST_PER_KTOK)
@@ -110,6 +171,17 @@ def analyze_project_comprehensive(project_root: str, entry_file: str = None) ->
     strategy3_output_cost = calculate_cost(avg_chunk_tokens, CLAUDE_OUTPUT_COST_PER_KTOK)
     strategy3_total = strategy3_input_cost + strategy3_output_cost
 
+    extra_stats = ""
+    if 'cache_hits' in chunk_analysis:
+        extra_stats = f"\n- **Cache Hits/Misses**: {chunk_analysis['cache_hits']:,} / {chunk_analysis['cache_misses']:,}"
+    if 'chunker' in chunk_analysis:
+        extra_stats += f"\n- **Chunker**: {chunk_analysis['chunker']}"
+    if chunk_analysis.get('token_mode') == "estimate":
+        extra_stats += f"\n- **Token Counts**: estimated at {chunk_analysis['bytes_per_token']:.2f} bytes/token"
+    if 'files_changed' in chunk_analysis:
+        extra_stats += (f"\n- **Changed Since {chunk_analysis['since']}**: {chunk_analysis['files_changed']:,} files "
+                       f"({chunk_analysis['files_deleted']:,} deleted), {chunk_analysis['affected_chunks']:,} chunks")
+
     markdown_output = f"""
 # Comprehensive Code Analyzer Cost Breakdown
 
@@ -118,7 +190,7 @@ def analyze_project_comprehensive(project_root: str, entry_file: str = None) ->
 - **Total Chunks**: {chunk_analysis['total_chunks']:,}
 - **Total Tokens**: {chunk_analysis['total_tokens']:,}
 - **Average Tokens per Chunk**: {avg_chunk_tokens:.1f}
-- **Average Tokens per File**: {avg_tokens_per_file:.1f}
+- **Average Tokens per File**: {avg_tokens_per_file:.1f}{extra_stats}
 
 ## Storage Requirements
 - **Raw Code Storage**: {storage['raw_code_gb']:.3f} GB
@@ -167,7 +239,7 @@ def analyze_project_comprehensive(project_root: str, entry_file: str = None) ->
 | Component | Cost | Details |
 |-----------|------|---------|
 | **File Monitoring** | ${phase3_costs['monitoring_monthly_cost']:.6f}/month | Per file change detection |
-| **Re-summarization (Input)** | ${phase3_costs['resummary_input_cost']:.6f} | Process {phase3_costs['affected_chunks']} changed chunks |
+| **Re-summarization (Input)** | ${phase3_costs['resummary_input_cost']:.6f} | Process {phase3_costs['affected_chunks']:,.0f} changed chunks |
 | **Re-summarization (Output)** | ${phase3_costs['resummary_output_cost']:.6f} | Generate new summaries |
 | **Re-embedding** | ${phase3_costs['reembedding_cost']:.6f} | Update vector embeddings |
 | **Database Updates** | ${phase3_costs['db_update_cost']:.6f} | Update vector + metadata DBs |
@@ -204,30 +276,152 @@ def analyze_project_comprehensive(project_root: str, entry_file: str = None) ->
 """
     return markdown_output
 
+def render_json(analysis: ProjectAnalysis) -> str:
+    """Generate machine-readable statistics and costs"""
+    return json.dumps({
+        'project_name': analysis.project_name,
+        'project_root': analysis.project_root,
+        'entry_file': analysis.entry_file,
+        'chunk_analysis': analysis.chunk_analysis,
+        'avg_tokens_per_file': analysis.avg_tokens_per_file,
+        'phase1_costs': analysis.phase1_costs,
+        'phase2_costs': analysis.phase2_costs,
+        'phase3_costs': analysis.phase3_costs,
+    }, indent=2)
+
+RENDERERS = {
+    "markdown": render_markdown,
+    "latex": render_latex,
+    "json": render_json,
+}
+
+def analyze_project_latex(project_root: str, entry_file: str = None, project_name: str = None, **scan_options) -> str:
+    return render_latex(compute_project_analysis(project_root, entry_file, project_name, **scan_options))
+
+def analyze_project_comprehensive(project_root: str, entry_file: str = None, **scan_options) -> str:
+    return render_markdown(compute_project_analysis(project_root, entry_file, **scan_options))
+
+
+def analyze_project(project_root: str, entry_file: str = None, format_type: str = "markdown", formats=None, **scan_options):
+    """Analyze project and return results in specified format.
+
+    With ``formats`` (e.g. ``["markdown", "latex", "json"]``) the project is scanned
+    once and a dict of format name -> rendered output is returned.
+    """
+    analysis = compute_project_analysis(project_root, entry_file, **scan_options)
+    if formats is None:
+        return RENDERERS.get(format_type, render_markdown)(analysis)
+    return render_formats(analysis, formats)
+
+def render_formats(analysis: ProjectAnalysis, formats) -> dict:
+    """Format name -> rendered output for one analysis."""
+    unknown = [fmt for fmt in formats if fmt not in RENDERERS]
+    if unknown:
+        raise ValueError(f"Unknown output format(s): {', '.join(unknown)}")
+    outputs = {}
+    for fmt in formats:
+        with PROFILER.stage(f"render {fmt}"):
+            outputs[fmt] = RENDERERS[fmt](analysis)
+    return outputs
+
+
+def _print_progress(totals: dict):
+    print(f"... {totals['files_processed']:,} files, {totals['total_chunks']:,} chunks, "
+          f"{totals['total_tokens']:,} tokens", file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate indexing and query costs for a Python project")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes for chunking/tokenization (default: serial)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Re-parse and re-tokenize every file instead of using the on-disk cache")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH,
+                        help=f"SQLite file for per-file chunk/token results (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Evict least recently used files beyond this many cache entries")
+    parser.add_argument("--io-threads", type=int, default=IO_THREADS,
+                        help="Threads per process reading files ahead of parsing, for NFS/cold caches (1 reads synchronously)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Chunk files as they are discovered with bounded memory, printing partial totals")
+    parser.add_argument("--since", metavar="GIT_REF", default=None,
+                        help="Only re-chunk .py files changed since this git ref, updating the saved per-file snapshot")
+    parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT_PATH,
+                        help=f"Per-file totals used and updated by --since (default: {DEFAULT_SNAPSHOT_PATH})")
+    parser.add_argument("--token-mode", choices=("exact", "estimate"), default="exact",
+                        help="'estimate' derives token counts from byte length for quick sizing runs")
+    parser.add_argument("--bytes-per-token", type=float, default=None,
+                        help="Fixed ratio for --token-mode estimate (default: calibrate on a sample of files)")
+    parser.add_argument("--chunker", choices=CHUNKERS, default=DEFAULT_CHUNKER,
+                        help="'ast' counts nested definitions inside their parents too; 'ast-flat' and 'astchunk' "
+                             "do not overlap, and 'astchunk' matches split_chunk's export")
+    parser.add_argument("--max-chunk-size", type=int, default=DEFAULT_CHUNK_CONFIG["max_chunk_size"],
+                        help="Maximum non-whitespace characters per chunk for --chunker astchunk")
+    parser.add_argument("--export", metavar="PATH", default=None,
+                        help="Also write the chunks to PATH (split_chunk's jsonl layout) from the same scan")
+    parser.add_argument("--breakdown", metavar="DIR", default=None,
+                        help="Also write per-file, per-chunk and per-directory results (JSON + CSV) to DIR")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record per-stage wall time and call counts and print them after the report")
+    parser.add_argument("--format", dest="formats", action="append", choices=OUTPUT_FORMATS,
+                        help="Output format; repeat for several (default: markdown and latex)")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Write the report to this file as-is, without section headers (needs exactly one --format)")
+    args = parser.parse_args(argv)
+    if args.since is not None and args.token_mode == "estimate":
+        parser.error("--since keeps exact per-file counts and cannot be combined with --token-mode estimate")
+    if args.since is not None and (args.chunker != DEFAULT_CHUNKER or args.export or args.breakdown):
+        parser.error("--since uses the default chunker and cannot be combined with --chunker, --export or --breakdown")
+    formats = args.formats or ["markdown", "latex"]
+    if args.output and len(formats) != 1:
+        parser.error("--output writes a single report; pass exactly one --format")
+    PROFILER.enabled = args.profile
+    cache = None if args.no_cache else ChunkCache(args.cache_path, args.cache_max_entries)
+    chunk_config = {"max_chunk_size": args.max_chunk_size} if args.chunker == "astchunk" else None
+    export = ChunkExportWriter(args.export) if args.export else None
 
-def analyze_project(project_root: str, entry_file: str = None, format_type: str = "markdown") -> str:
-    """Analyze project and return results in specified format"""
-    if format_type == "latex":
-        return analyze_project_latex(project_root, entry_file)
-    else:
-        return analyze_project_comprehensive(project_root, entry_file)
-
-
-def main():
     project_root = "core/homeassistant"  # Default project root
     entry_file = os.path.join(project_root, "__init__.py")
     if not os.path.exists(project_root):
-        print(f"Project root '{project_root}' not found. Using current directory.")
+        print(f"Project root '{project_root}' not found. Using current directory.", file=sys.stderr)
         project_root = "."
         entry_file = "combined_analyzer.py"
     if not os.path.isfile(entry_file):
         entry_file = None
-
-    # Generate both formats
-    print("=== MARKDOWN FORMAT ===")
-    print(analyze_project(project_root, entry_file, "markdown"))
-    print("\n=== LATEX FORMAT ===")
-    print(analyze_project(project_root, entry_file, "latex"))
+    breakdown = ScanBreakdown(project_root) if args.breakdown else None
+
+    # Scan once, render every requested format
+    try:
+        analysis = compute_project_analysis(project_root, entry_file, since=args.since, snapshot_path=args.snapshot,
+                                            workers=args.workers, cache=cache, stream=args.stream,
+                                            progress=_print_progress if args.stream else None,
+                                            token_mode=args.token_mode, bytes_per_token=args.bytes_per_token,
+                                            chunker=args.chunker, chunk_config=chunk_config, export=export,
+                                            io_threads=args.io_threads, breakdown=breakdown)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    finally:
+        if cache is not None:
+            cache.close()
+        if export is not None:
+            export.close()
+    outputs = render_formats(analysis, formats)
+    if breakdown is not None:
+        # Same totals as breakdown.scan_breakdown stores
+        breakdown.totals = analysis.chunk_analysis
+        breakdown.write(args.breakdown)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(outputs[formats[0]])
+    else:
+        for i, fmt in enumerate(formats):
+            if i:
+                print()
+            print(f"=== {fmt.upper()} FORMAT ===")
+            print(outputs[fmt])
+    if args.profile:
+        print("\n=== PROFILE ===")
+        print(PROFILER.report())
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,7 @@
 from cost_constants import *
-from utils import count_tokens
+
+# numpy is imported on first use of a *_batch function, so scalar callers never pay for it
+np = None
 
 def calculate_cost(tokens: float, cost_per_ktok: float) -> float:
     return (tokens / 1000) * cost_per_ktok
@@ -67,9 +69,10 @@ def calculate_phase2_costs(avg_prompt_tokens: int = 100, avg_response_tokens: in
         'output_tokens_used': avg_chunk_tokens
     }
 
-def calculate_phase3_costs(files_changed: int = 1, avg_chunks_per_file: int = 10, avg_chunk_tokens: float = 200, avg_summary_tokens: int = 150) -> dict:
+def calculate_phase3_costs(files_changed: int = 1, avg_chunks_per_file: float = 10, avg_chunk_tokens: float = 200, avg_summary_tokens: int = 150, affected_chunks: int = None) -> dict:
     monitoring_monthly_cost = files_changed * FILE_MONITORING_COST_PER_FILE_MONTH
-    affected_chunks = files_changed * avg_chunks_per_file
+    if affected_chunks is None:
+        affected_chunks = files_changed * avg_chunks_per_file
     resummary_input_cost = calculate_cost(affected_chunks * avg_chunk_tokens, CLAUDE_INPUT_COST_PER_KTOK)
     resummary_output_cost = calculate_cost(affected_chunks * avg_summary_tokens, CLAUDE_OUTPUT_COST_PER_KTOK)
     reembedding_cost = calculate_cost(affected_chunks * avg_summary_tokens, UPDATE_EMBEDDING_COST_PER_KTOK)
@@ -85,3 +88,93 @@ def calculate_phase3_costs(files_changed: int = 1, avg_chunks_per_file: int = 10
         'affected_chunks': affected_chunks
     }
 
+
+
+# Vectorized variants: every argument may be a scalar or an array, arguments are
+# broadcast against each other and each result key maps to an array.
+
+def require_numpy():
+    """Import numpy on first use; the batch cost functions, cost_sweep and retrieval_sim need it."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("This requires numpy (pip install numpy)") from None
+        np = numpy
+    return np
+
+def _broadcast(*values):
+    require_numpy()
+    return np.broadcast_arrays(*(np.asarray(value, dtype=np.float64) for value in values))
+
+def calculate_phase1_costs_batch(total_chunks, avg_tokens_per_chunk, size, avg_summary_tokens=150) -> dict:
+    total_chunks, avg_chunk_tokens, size, avg_summary_tokens = _broadcast(total_chunks, avg_tokens_per_chunk, size, avg_summary_tokens)
+    raw_code_gb = np.maximum(size / (1024**3), 0.001)
+    summary_storage_gb = np.maximum((total_chunks * avg_summary_tokens * 4) / (1024**3), 0.001)
+    vector_storage_gb = np.maximum((total_chunks * 1536 * 4) / (1024**3), 0.001)
+    metadata_storage_gb = np.maximum((total_chunks * 1024) / (1024**3), 0.001)
+    summarization_input_cost = calculate_cost(total_chunks * avg_chunk_tokens, CLAUDE_INPUT_COST_PER_KTOK)
+    summarization_output_cost = calculate_cost(total_chunks * avg_summary_tokens, CLAUDE_OUTPUT_COST_PER_KTOK)
+    embedding_cost = calculate_cost(total_chunks * avg_summary_tokens, EMBEDDING_COST_PER_KTOK)
+    object_storage_monthly = raw_code_gb * OBJECT_STORAGE_COST_PER_GB_MONTH
+    vector_db_storage_monthly = vector_storage_gb * VECTOR_DB_STORAGE_COST_PER_GB_MONTH
+    metadata_storage_monthly = metadata_storage_gb * METADATA_DB_STORAGE_COST_PER_GB_MONTH
+    return {
+        'summarization_input_cost': summarization_input_cost,
+        'summarization_output_cost': summarization_output_cost,
+        'embedding_cost': embedding_cost,
+        'object_storage_monthly': object_storage_monthly,
+        'vector_db_storage_monthly': vector_db_storage_monthly,
+        'metadata_storage_monthly': metadata_storage_monthly,
+        'total_one_time': summarization_input_cost + summarization_output_cost + embedding_cost,
+        'total_monthly_storage': object_storage_monthly + vector_db_storage_monthly + metadata_storage_monthly,
+        'raw_code_gb': raw_code_gb,
+        'summary_storage_gb': summary_storage_gb,
+        'vector_storage_gb': vector_storage_gb,
+        'metadata_storage_gb': metadata_storage_gb,
+    }
+
+def calculate_phase2_costs_batch(avg_prompt_tokens=100, avg_response_tokens=500, chunks_retrieved=3, avg_chunk_tokens=200) -> dict:
+    # Like calculate_phase2_costs, the final output is priced at avg_chunk_tokens; avg_response_tokens is only broadcast
+    avg_prompt_tokens, _, chunks_retrieved, avg_chunk_tokens = _broadcast(avg_prompt_tokens, avg_response_tokens, chunks_retrieved, avg_chunk_tokens)
+    prompt_parsing_input_cost = calculate_cost(avg_prompt_tokens, PROMPT_PARSING_LLM_INPUT_COST_PER_KTOK)
+    prompt_parsing_output_cost = np.full_like(avg_prompt_tokens, calculate_cost(50, PROMPT_PARSING_LLM_OUTPUT_COST_PER_KTOK))
+    vector_search_cost = np.full_like(avg_prompt_tokens, VECTOR_SEARCH_COST_PER_1K_OPS / 1000)
+    prompt_embedding_cost = calculate_cost(avg_prompt_tokens, PROMPT_EMBEDDING_COST_PER_KTOK)
+    retrieval_cost = chunks_retrieved * OBJECT_RETRIEVAL_COST_PER_REQUEST
+    final_input_tokens = avg_prompt_tokens + (chunks_retrieved * avg_chunk_tokens)
+    final_input_cost = calculate_cost(final_input_tokens, CLAUDE_INPUT_COST_PER_KTOK)
+    final_output_cost = calculate_cost(avg_chunk_tokens, CLAUDE_OUTPUT_COST_PER_KTOK)
+    total_per_prompt = (prompt_parsing_input_cost + prompt_parsing_output_cost + vector_search_cost + prompt_embedding_cost + retrieval_cost + final_input_cost + final_output_cost)
+    return {
+        'prompt_parsing_input_cost': prompt_parsing_input_cost,
+        'prompt_parsing_output_cost': prompt_parsing_output_cost,
+        'vector_search_cost': vector_search_cost,
+        'prompt_embedding_cost': prompt_embedding_cost,
+        'retrieval_cost': retrieval_cost,
+        'final_input_cost': final_input_cost,
+        'final_output_cost': final_output_cost,
+        'total_per_prompt': total_per_prompt,
+        'input_tokens_used': final_input_tokens,
+        'output_tokens_used': avg_chunk_tokens
+    }
+
+def calculate_phase3_costs_batch(files_changed=1, avg_chunks_per_file=10, avg_chunk_tokens=200, avg_summary_tokens=150) -> dict:
+    files_changed, avg_chunks_per_file, avg_chunk_tokens, avg_summary_tokens = _broadcast(files_changed, avg_chunks_per_file, avg_chunk_tokens, avg_summary_tokens)
+    monitoring_monthly_cost = files_changed * FILE_MONITORING_COST_PER_FILE_MONTH
+    affected_chunks = files_changed * avg_chunks_per_file
+    resummary_input_cost = calculate_cost(affected_chunks * avg_chunk_tokens, CLAUDE_INPUT_COST_PER_KTOK)
+    resummary_output_cost = calculate_cost(affected_chunks * avg_summary_tokens, CLAUDE_OUTPUT_COST_PER_KTOK)
+    reembedding_cost = calculate_cost(affected_chunks * avg_summary_tokens, UPDATE_EMBEDDING_COST_PER_KTOK)
+    db_update_cost = affected_chunks * 2 * DB_UPDATE_COST_PER_OPERATION
+    total_per_update = resummary_input_cost + resummary_output_cost + reembedding_cost + db_update_cost
+    return {
+        'monitoring_monthly_cost': monitoring_monthly_cost,
+        'resummary_input_cost': resummary_input_cost,
+        'resummary_output_cost': resummary_output_cost,
+        'reembedding_cost': reembedding_cost,
+        'db_update_cost': db_update_cost,
+        'total_per_update': total_per_update,
+        'affected_chunks': affected_chunks
+    }
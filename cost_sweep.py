@@ -0,0 +1,122 @@
+import sys
+import csv
+import json
+import time
+import argparse
+from typing import Dict, List, Tuple
+
+from cost_calculations import (require_numpy, calculate_phase1_costs_batch, calculate_phase2_costs_batch,
+                               calculate_phase3_costs_batch)
+
+DAYS_PER_MONTH = 30
+
+SWEEP_PARAMETERS = {
+    # name: (CLI default, help)
+    'prompts_per_day': ("100,1000", "Prompts per day"),
+    'chunks_retrieved': ("3", "Chunks retrieved per prompt"),
+    'avg_prompt_tokens': ("100", "Tokens in the user prompt"),
+    'updates_per_month': ("10", "File updates per month"),
+    'files_per_update': ("1", "Files changed per update"),
+}
+
+def parse_values(spec: str):
+    """'1,5,10' lists values; 'start:stop:step' is an arange (stop excluded)."""
+    np = require_numpy()
+    if ":" in spec:
+        start, stop, step = (float(part) for part in spec.split(":"))
+        return np.arange(start, stop, step)
+    return np.array([float(value) for value in spec.split(",") if value.strip()])
+
+def load_repo_stats(paths: List[str]) -> List[Tuple[str, Dict]]:
+    """Read chunk_analysis dicts from JSON files: a report from `combined_analyzer --format json
+    --output FILE` or batch_analyzer's report.json, a bare chunk_analysis dict, or a list of either."""
+    repos = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for i, entry in enumerate(data if isinstance(data, list) else [data]):
+            chunk_analysis = entry.get('chunk_analysis', entry)
+            name = entry.get('project_name') or entry.get('project_root') or (path if i == 0 else f"{path}[{i}]")
+            repos.append((name, chunk_analysis))
+    return repos
+
+def sweep_costs(repos: List[Tuple[str, Dict]], **parameters) -> Dict:
+    """Cost table over the cartesian product of repos and every swept parameter, as columns."""
+    np = require_numpy()
+    names = list(SWEEP_PARAMETERS)
+    axes = [np.arange(len(repos))] + [np.asarray(parameters[name], dtype=np.float64) for name in names]
+    grid = [axis.ravel() for axis in np.meshgrid(*axes, indexing='ij')]
+    repo_index = grid[0].astype(np.int64)
+    columns = dict(zip(names, grid[1:]))
+
+    total_chunks = np.array([stats['total_chunks'] for _, stats in repos], dtype=np.float64)
+    avg_chunk_tokens = np.array([stats['avg_tokens_per_chunk'] for _, stats in repos], dtype=np.float64)
+    size = np.array([stats['size'] for _, stats in repos], dtype=np.float64)
+    files = np.array([stats['files_processed'] for _, stats in repos], dtype=np.float64)
+    avg_chunks_per_file = np.divide(total_chunks, files, out=np.zeros_like(total_chunks), where=files > 0)
+
+    # Per-repo phase 1 is computed once and then spread over the grid
+    phase1 = calculate_phase1_costs_batch(total_chunks, avg_chunk_tokens, size)
+    # Phase 2 prices the model output at the average chunk size, so there is no response-length axis
+    phase2 = calculate_phase2_costs_batch(avg_prompt_tokens=columns['avg_prompt_tokens'],
+                                          chunks_retrieved=columns['chunks_retrieved'],
+                                          avg_chunk_tokens=avg_chunk_tokens[repo_index])
+    phase3 = calculate_phase3_costs_batch(columns['files_per_update'], avg_chunks_per_file[repo_index],
+                                          avg_chunk_tokens[repo_index])
+
+    table = {'repo': np.array([name for name, _ in repos], dtype=object)[repo_index]}
+    table.update(columns)
+    table['one_time_cost'] = phase1['total_one_time'][repo_index]
+    table['monthly_storage_cost'] = phase1['total_monthly_storage'][repo_index]
+    table['cost_per_prompt'] = phase2['total_per_prompt']
+    table['cost_per_update'] = phase3['total_per_update']
+    table['monthly_prompt_cost'] = phase2['total_per_prompt'] * columns['prompts_per_day'] * DAYS_PER_MONTH
+    table['monthly_update_cost'] = phase3['total_per_update'] * columns['updates_per_month']
+    table['monthly_total'] = table['monthly_storage_cost'] + table['monthly_prompt_cost'] + table['monthly_update_cost']
+    return table
+
+def write_table(table: Dict, output: str = None):
+    if output and output.endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("Writing .parquet requires pyarrow; use a .csv output instead")
+        pq.write_table(pa.table({name: column.tolist() if column.dtype == object else column
+                                 for name, column in table.items()}), output)
+        return
+    out = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(table.keys())
+        writer.writerows(zip(*(column.tolist() for column in table.values())))
+    finally:
+        if output:
+            out.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep cost scenarios across repositories")
+    parser.add_argument("stats", nargs="*", help="JSON reports with chunk statistics (combined_analyzer --format json --output FILE, "
+                             "or batch_analyzer's report.json)")
+    parser.add_argument("--repo", action="append", default=[], help="Scan this directory for chunk statistics; repeatable")
+    for name, (default, help_text) in SWEEP_PARAMETERS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, default=default,
+                            help=f"{help_text}: comma list or start:stop:step (default: {default})")
+    parser.add_argument("--output", "-o", default=None, help="Write .csv or .parquet here (default: CSV to stdout)")
+    args = parser.parse_args(argv)
+
+    repos = load_repo_stats(args.stats)
+    if args.repo:
+        from utils import analyze_chunks_average
+        repos += [(root, analyze_chunks_average(root)) for root in args.repo]
+    if not repos:
+        parser.error("give at least one stats file or --repo")
+
+    start = time.perf_counter()
+    table = sweep_costs(repos, **{name: parse_values(getattr(args, name)) for name in SWEEP_PARAMETERS})
+    elapsed = time.perf_counter() - start
+    write_table(table, args.output)
+    print(f"{len(table['repo']):,} scenarios computed in {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import os
+import json
+import subprocess
+from typing import Dict, List, Optional, Set, Tuple
+
+from chunk_cache import ChunkCache
+from profiling import PROFILER
+from utils import CACHE_NAMESPACE, iter_file_stats, analyze_files, summarize_totals
+
+DEFAULT_SNAPSHOT_PATH = ".code_analyzer_snapshot.json"
+
+def _git(cwd: str, *args: str) -> str:
+    try:
+        with PROFILER.stage("git"):
+            return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"git {' '.join(args)} failed: {e.stderr.strip()}") from e
+
+def _relative_py_path(root: str, toplevel: str, git_path: str) -> Optional[str]:
+    # root must be symlink-resolved like git's --show-toplevel, or every path lands outside it
+    rel = os.path.relpath(os.path.join(toplevel, git_path), root)
+    if rel.startswith(os.pardir + os.sep) or not rel.endswith(".py"):
+        return None
+    return rel
+
+def git_changed_files(project_root: str, since: str) -> Tuple[List[str], List[str]]:
+    """(added_or_modified, deleted) .py files under project_root between `since` and the working tree.
+
+    Paths are relative to project_root. Renames are reported as delete + add.
+    """
+    root = os.path.realpath(project_root)
+    toplevel = _git(root, "rev-parse", "--show-toplevel").strip()
+    fields = _git(toplevel, "diff", "--name-status", "--no-renames", "-z", since, "--").split("\0")
+    changed, deleted = [], []
+    for status, git_path in zip(fields[0::2], fields[1::2]):
+        rel = _relative_py_path(root, toplevel, git_path)
+        if rel is None:
+            continue
+        (deleted if status.startswith("D") else changed).append(rel)
+    return changed, deleted
+
+def _untracked_files(project_root: str, ignored: bool = False) -> List[str]:
+    """Untracked .py files under project_root; with ignored=True the gitignored ones instead."""
+    root = os.path.realpath(project_root)
+    toplevel = _git(root, "rev-parse", "--show-toplevel").strip()
+    args = ["ls-files", "--others", "--exclude-standard", "-z"] + (["--ignored"] if ignored else [])
+    paths = _git(toplevel, *args).split("\0")
+    return [rel for rel in (_relative_py_path(root, toplevel, p) for p in paths if p) if rel is not None]
+
+def _ignored_signatures(project_root: str) -> Dict[str, List[int]]:
+    # git never reports changes to ignored files, so they are tracked by (mtime_ns, size)
+    signatures = {}
+    for rel in _untracked_files(project_root, ignored=True):
+        try:
+            st = os.stat(os.path.join(project_root, rel))
+        except OSError:
+            continue
+        signatures[rel] = [st.st_mtime_ns, st.st_size]
+    return signatures
+
+def load_snapshot(snapshot_path: str, project_root: str) -> Optional[Dict]:
+    try:
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get('project_root') != os.path.abspath(project_root) or snapshot.get('namespace') != CACHE_NAMESPACE:
+        return None
+    return snapshot
+
+def save_snapshot(snapshot: Dict, snapshot_path: str):
+    tmp_path = snapshot_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, snapshot_path)
+
+def build_snapshot(project_root: str, workers: Optional[int] = None, cache: Optional[ChunkCache] = None,
+                   stream: bool = False) -> Dict:
+    files = {}
+    for file_path, size, chunks, tokens in iter_file_stats(project_root, workers=workers, cache=cache, stream=stream):
+        files[os.path.relpath(file_path, project_root)] = [size, chunks, tokens]
+    if cache is not None:
+        cache.flush()
+    return {'project_root': os.path.abspath(project_root), 'namespace': CACHE_NAMESPACE, 'files': files}
+
+def _refresh_files(snapshot: Dict, project_root: str, rel_paths: Set[str], workers: Optional[int] = None):
+    files = snapshot['files']
+    present = {}
+    for rel in sorted(rel_paths):
+        file_path = os.path.join(project_root, rel)
+        if os.path.isfile(file_path):
+            present[file_path] = rel
+        else:
+            files.pop(rel, None)
+    # Large diffs (branch switches, rebases) go through the worker pool like a full scan
+    for file_path, size, chunks, tokens in analyze_files(list(present), workers):
+        files[present[file_path]] = [size, chunks, tokens]
+
+def analyze_since(project_root: str, since: str, snapshot_path: str = DEFAULT_SNAPSHOT_PATH,
+                  workers: Optional[int] = None, cache: Optional[ChunkCache] = None, stream: bool = False) -> Dict:
+    """analyze_chunks_average-style totals, re-chunking only files git reports as changed.
+
+    The snapshot records HEAD and the files that were dirty when it was written, so
+    anything that changed since then is refreshed too, not just the diff against `since`.
+    Gitignored .py files are part of the totals like in a full scan; git does not report
+    their changes, so they are refreshed when their (mtime, size) differs from the snapshot.
+    Without a usable snapshot the whole tree is scanned once to seed it.
+    """
+    changed, deleted = git_changed_files(project_root, since)
+    # Untracked files are not in any commit, so they are new relative to `since` as well
+    untracked = _untracked_files(project_root)
+    tracked_changes = set(changed)
+    changed += [rel for rel in untracked if rel not in tracked_changes]
+    head = _git(os.path.realpath(project_root), "rev-parse", "HEAD").strip()
+    snapshot = load_snapshot(snapshot_path, project_root)
+    ignored = _ignored_signatures(project_root)
+    if snapshot is not None:
+        stale = set(changed) | set(deleted) | set(snapshot.get('dirty', []))
+        ignored_before = snapshot.get('ignored', {})
+        stale |= {rel for rel, signature in ignored.items() if ignored_before.get(rel) != signature}
+        stale |= set(ignored_before) - set(ignored)
+        try:
+            # Everything that differs from the snapshot's commit, committed or not
+            snapshot_changed, snapshot_deleted = git_changed_files(project_root, snapshot['head'])
+        except (KeyError, RuntimeError):
+            # The snapshot's commit is unknown here (e.g. rewritten history): start over
+            snapshot = None
+        else:
+            stale |= set(snapshot_changed) | set(snapshot_deleted)
+    rescanned = snapshot is None
+    if rescanned:
+        snapshot = build_snapshot(project_root, workers, cache, stream)
+    else:
+        _refresh_files(snapshot, project_root, stale, workers)
+    head_changed, head_deleted = git_changed_files(project_root, "HEAD")
+    snapshot['head'] = head
+    snapshot['dirty'] = head_changed + head_deleted + untracked
+    snapshot['ignored'] = ignored
+    save_snapshot(snapshot, snapshot_path)
+
+    files = snapshot['files']
+    changed_stats = [files[rel] for rel in changed if rel in files]
+    result = summarize_totals(len(files), sum(chunks for _, chunks, _ in files.values()),
+                              sum(tokens for _, _, tokens in files.values()), sum(size for size, _, _ in files.values()))
+    result.update({
+        'since': since,
+        'files_changed': len(changed_stats),
+        'files_deleted': len(deleted),
+        'affected_chunks': sum(chunks for _, chunks, _ in changed_stats),
+        'affected_tokens': sum(tokens for _, _, tokens in changed_stats),
+        'snapshot_rescanned': rescanned,
+    })
+    return result
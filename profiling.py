@@ -0,0 +1,74 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, Iterator, List
+
+# Returned by stage() while disabled; nullcontext is reusable, so no generator is built per call
+_NO_STAGE = nullcontext()
+
+class Profiler:
+    """Per-stage wall time and call counts; every hook is a no-op until enabled."""
+
+    def __init__(self):
+        self.enabled = False
+        self.stats: Dict[str, List[float]] = {}
+
+    def record(self, name: str, seconds: float, calls: int = 1):
+        entry = self.stats.get(name)
+        if entry is None:
+            self.stats[name] = [calls, seconds]
+        else:
+            entry[0] += calls
+            entry[1] += seconds
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NO_STAGE
+        return self._timed_stage(name)
+
+    @contextmanager
+    def _timed_stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield from iterable, charging the time spent producing each item to `name`."""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.record(name, time.perf_counter() - start, 0)
+                return
+            self.record(name, time.perf_counter() - start)
+            yield item
+
+    def merge(self, stats: Dict[str, List[float]], suffix: str = ""):
+        for name, (calls, seconds) in stats.items():
+            self.record(name + suffix, seconds, calls)
+
+    def drain(self) -> Dict[str, List[float]]:
+        stats = self.stats
+        self.stats = {}
+        return stats
+
+    def reset(self):
+        self.stats = {}
+
+    def report(self) -> str:
+        lines = [
+            "| Stage | Calls | Wall Time (s) | Avg (ms) |",
+            "|-------|-------|---------------|----------|",
+        ]
+        for name, (calls, seconds) in sorted(self.stats.items(), key=lambda item: item[1][1], reverse=True):
+            avg_ms = seconds / calls * 1000 if calls else 0
+            lines.append(f"| {name} | {int(calls):,} | {seconds:.3f} | {avg_ms:.3f} |")
+        return "\n".join(lines)
+
+PROFILER = Profiler()
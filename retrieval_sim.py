@@ -0,0 +1,321 @@
+import re
+import sys
+import csv
+import json
+import math
+import time
+import zlib
+import random
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from chunking import CHUNKERS, DEFAULT_CHUNKER
+from cost_calculations import require_numpy, calculate_phase2_costs, calculate_phase2_costs_batch
+from profiling import PROFILER
+from utils import DEFAULT_BYTES_PER_TOKEN, analyze_chunks_average, count_tokens_batch
+
+HASH_DIMS = 1024
+DEFAULT_TOP_K = 3
+# Candidates considered per query when chunks are skipped for not fitting the budget
+CANDIDATE_FACTOR = 4
+SYNTHETIC_QUERY_TERMS = 6
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+_WORD_PART = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z0-9]+")
+
+def iter_terms(text: str) -> Iterator[str]:
+    """Lowercased identifiers plus their camelCase/snake_case parts."""
+    for word in _WORD.findall(text):
+        lowered = word.lower()
+        yield lowered
+        parts = _WORD_PART.findall(word)
+        if len(parts) > 1:
+            for part in parts:
+                yield part.lower()
+
+class HashingVectorizer:
+    """Deterministic bag-of-words vectors: terms are hashed with CRC32 into `dims` signed
+    buckets, weighted 1 + log(tf) and L2-normalized. No vocabulary and no network."""
+
+    def __init__(self, dims: int = HASH_DIMS):
+        self.dims = dims
+        self._buckets: Dict[str, Tuple[int, float]] = {}
+
+    def _bucket(self, term: str) -> Tuple[int, float]:
+        bucket = self._buckets.get(term)
+        if bucket is None:
+            h = zlib.crc32(term.encode('utf-8'))
+            bucket = self._buckets[term] = (h % self.dims, 1.0 if h & 0x80000000 else -1.0)
+        return bucket
+
+    def features(self, text: str) -> Dict[int, float]:
+        counts: Dict[int, float] = {}
+        for term in iter_terms(text):
+            column, sign = self._bucket(term)
+            counts[column] = counts.get(column, 0.0) + sign
+        weights = {column: math.copysign(1 + math.log(abs(count)), count)
+                   for column, count in counts.items() if count}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {column: weight / norm for column, weight in weights.items()} if norm else {}
+
+    def transform(self, texts: List[str]):
+        np = require_numpy()
+        matrix = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for column, weight in self.features(text).items():
+                matrix[row, column] = weight
+        return matrix
+
+class VectorIndex:
+    """In-memory chunk index: one float32 row per chunk plus its path and token count.
+
+    Chunks come in through add_file (the scan's export hook, see utils.iter_file_stats) or
+    add_chunk; build() assembles the matrix. Chunk text is dropped once vectorized, apart
+    from a seeded reservoir sample kept for synthetic queries.
+    """
+
+    def __init__(self, vectorizer: Optional[HashingVectorizer] = None, sample_size: int = 0, seed: int = 0):
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self.paths: List[str] = []
+        self.lines: List[Tuple[int, int]] = []
+        self.tokens: List[int] = []
+        self._columns: List[int] = []
+        self._weights: List[float] = []
+        self._row_ends: List[int] = []
+        self.sample: List[str] = []
+        self._sample_size = sample_size
+        self._rng = random.Random(seed)
+        self.matrix = None
+        self.token_array = None
+        self.build_seconds = 0.0
+
+    def add_chunk(self, file_path: str, content: str, tokens: int, start_line: int = 0, end_line: int = 0):
+        start = time.perf_counter()
+        features = self.vectorizer.features(content)
+        self._columns.extend(features)
+        self._weights.extend(features.values())
+        self._row_ends.append(len(self._columns))
+        self.paths.append(file_path)
+        self.lines.append((start_line, end_line))
+        self.tokens.append(tokens)
+        self.build_seconds += time.perf_counter() - start
+        if self._sample_size:
+            seen = len(self.tokens)
+            if len(self.sample) < self._sample_size:
+                self.sample.append(content)
+            else:
+                slot = self._rng.randrange(seen)
+                if slot < self._sample_size:
+                    self.sample[slot] = content
+
+    def add_file(self, file_path: str, source: str, chunks: List[Dict]):
+        for chunk in chunks:
+            metadata = chunk['metadata']
+            self.add_chunk(file_path, chunk['content'], metadata['token_count'],
+                           metadata.get('start_line_no', 0) + 1, metadata.get('end_line_no', 0) + 1)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def build(self):
+        np = require_numpy()
+        start = time.perf_counter()
+        row_ends = np.asarray(self._row_ends, dtype=np.int64)
+        row_lengths = np.diff(row_ends, prepend=0)
+        rows = np.repeat(np.arange(len(row_ends)), row_lengths)
+        self.matrix = np.zeros((len(row_ends), self.vectorizer.dims), dtype=np.float32)
+        self.matrix[rows, np.asarray(self._columns, dtype=np.int64)] = np.asarray(self._weights, dtype=np.float32)
+        self.token_array = np.asarray(self.tokens, dtype=np.int64)
+        self._columns, self._weights, self._row_ends = [], [], []
+        self.build_seconds += time.perf_counter() - start
+        return self
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K, token_budget: Optional[int] = None):
+        """Indices of the best-scoring chunks in rank order, at most top_k of them. With a
+        token budget, chunks that would overflow it are skipped in favour of lower-ranked
+        ones from a pool of top_k * CANDIDATE_FACTOR candidates."""
+        np = require_numpy()
+        scores = self.matrix @ self.vectorizer.transform([query])[0]
+        pool = min(len(scores), top_k * CANDIDATE_FACTOR if token_budget is not None else top_k)
+        if pool <= 0:
+            return []
+        candidates = np.argpartition(-scores, pool - 1)[:pool]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        if token_budget is None:
+            return candidates[:top_k].tolist()
+        selected = []
+        used = 0
+        for index in candidates.tolist():
+            tokens = self.tokens[index]
+            if used + tokens <= token_budget:
+                selected.append(index)
+                used += tokens
+                if len(selected) == top_k:
+                    break
+        return selected
+
+def load_queries(path: str) -> List[str]:
+    """One query per line, or JSONL records with a "query" (or "prompt") field."""
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                line = record.get('query') or record.get('prompt') or ""
+            queries.append(line)
+    return queries
+
+def synthetic_queries(index: VectorIndex, count: int, seed: int = 0) -> List[str]:
+    """Queries built from a few identifiers of sampled chunks, for runs without a query log."""
+    rng = random.Random(seed)
+    queries = []
+    for text in index.sample[:count]:
+        terms = sorted(set(iter_terms(text)))
+        if terms:
+            queries.append(" ".join(rng.sample(terms, min(SYNTHETIC_QUERY_TERMS, len(terms)))))
+    return queries
+
+def _percentiles(values) -> Dict:
+    np = require_numpy()
+    if len(values) == 0:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    values = np.asarray(values, dtype=np.float64)
+    return {'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)),
+            'p95': float(np.percentile(values, 95)), 'max': float(values.max())}
+
+def simulate(index: VectorIndex, queries: List[str], top_k: int = DEFAULT_TOP_K, token_budget: Optional[int] = None,
+             bytes_per_token: Optional[float] = None) -> Tuple[Dict, Dict]:
+    """Replay queries against the index; returns (summary, per-query columns).
+
+    As in calculate_phase2_costs, the model output is priced at the average size of the
+    chunks the query retrieved."""
+    np = require_numpy()
+    prompt_tokens = np.asarray(count_tokens_batch(queries, bytes_per_token), dtype=np.float64)
+    latencies = np.zeros(len(queries))
+    retrieved_chunks = np.zeros(len(queries))
+    retrieved_tokens = np.zeros(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        selected = index.search(query, top_k, token_budget)
+        latencies[i] = (time.perf_counter() - start) * 1000
+        retrieved_chunks[i] = len(selected)
+        retrieved_tokens[i] = index.token_array[selected].sum() if selected else 0
+    PROFILER.record("query", float(latencies.sum()) / 1000, len(queries))
+
+    avg_chunk_tokens = np.divide(retrieved_tokens, retrieved_chunks, out=np.zeros_like(retrieved_tokens),
+                                 where=retrieved_chunks > 0)
+    costs = calculate_phase2_costs_batch(avg_prompt_tokens=prompt_tokens, chunks_retrieved=retrieved_chunks,
+                                         avg_chunk_tokens=avg_chunk_tokens)
+    corpus_avg_tokens = float(index.token_array.mean()) if len(index) else 0
+    flat = calculate_phase2_costs(avg_prompt_tokens=float(prompt_tokens.mean()) if len(queries) else 0,
+                                  chunks_retrieved=top_k,
+                                  avg_chunk_tokens=corpus_avg_tokens)
+    summary = {
+        'chunks_indexed': len(index),
+        'dims': index.vectorizer.dims,
+        'index_bytes': int(index.matrix.nbytes),
+        'index_build_seconds': index.build_seconds,
+        'queries': len(queries),
+        'top_k': top_k,
+        'token_budget': token_budget,
+        'corpus_avg_chunk_tokens': corpus_avg_tokens,
+        'latency_ms': _percentiles(latencies),
+        'retrieved_chunks': _percentiles(retrieved_chunks),
+        'retrieved_tokens': _percentiles(retrieved_tokens),
+        'cost_per_prompt': _percentiles(costs['total_per_prompt']),
+        'flat_model_cost_per_prompt': flat['total_per_prompt'],
+    }
+    per_query = {
+        'query': queries,
+        'prompt_tokens': prompt_tokens,
+        'latency_ms': latencies,
+        'retrieved_chunks': retrieved_chunks,
+        'retrieved_tokens': retrieved_tokens,
+        'cost_per_prompt': costs['total_per_prompt'],
+    }
+    return summary, per_query
+
+def render_markdown(summary: Dict) -> str:
+    budget = f"{summary['token_budget']:,}" if summary['token_budget'] is not None else "none"
+    lines = [
+        "# Retrieval Simulation",
+        "",
+        f"- **Chunks Indexed**: {summary['chunks_indexed']:,} ({summary['dims']} dims, "
+        f"{summary['index_bytes'] / (1024 ** 2):.1f} MiB)",
+        f"- **Index Build Time**: {summary['index_build_seconds']:.3f}s",
+        f"- **Queries**: {summary['queries']:,} (top-{summary['top_k']}, token budget {budget})",
+        f"- **Flat-Model Cost per Prompt**: ${summary['flat_model_cost_per_prompt']:.6f} "
+        f"({summary['top_k']} x {summary['corpus_avg_chunk_tokens']:.1f} avg tokens)",
+        "",
+        "| Metric | Mean | P50 | P95 | Max |",
+        "|--------|------|-----|-----|-----|",
+    ]
+    rows = (("Query Latency (ms)", 'latency_ms', ".3f"), ("Chunks Retrieved", 'retrieved_chunks', ".2f"),
+            ("Tokens Retrieved", 'retrieved_tokens', ",.1f"), ("Cost per Prompt ($)", 'cost_per_prompt', ".6f"))
+    for label, key, fmt in rows:
+        stats = summary[key]
+        lines.append(f"| {label} | {stats['mean']:{fmt}} | {stats['p50']:{fmt}} | {stats['p95']:{fmt}} | "
+                     f"{stats['max']:{fmt}} |")
+    return "\n".join(lines)
+
+def write_per_query(per_query: Dict, output: str):
+    with open(output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(per_query.keys())
+        writer.writerows(zip(*(column if isinstance(column, list) else column.tolist()
+                               for column in per_query.values())))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a query log against a local vector index of the repo's chunks")
+    parser.add_argument("directory", nargs="?", default=".", help="Project root to chunk and index")
+    parser.add_argument("--chunks", default=None,
+                        help="Index a chunk export (split_chunk/combined_analyzer --export jsonl) instead of scanning")
+    parser.add_argument("--queries", default=None, help="Query log: one query per line, or .jsonl with a 'query' field")
+    parser.add_argument("--synthetic-queries", type=int, default=200,
+                        help="Queries sampled from the indexed chunks when no --queries log is given")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="Chunks retrieved per query")
+    parser.add_argument("--token-budget", type=int, default=None, help="Maximum retrieved chunk tokens per query")
+    parser.add_argument("--dims", type=int, default=HASH_DIMS, help="Hashing vectorizer dimensions")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic query sampling")
+    parser.add_argument("--chunker", choices=CHUNKERS, default=DEFAULT_CHUNKER, help="Chunking strategy when scanning")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for chunking/tokenization")
+    parser.add_argument("--token-mode", choices=("exact", "estimate"), default="exact",
+                        help="'estimate' derives token counts from byte length")
+    parser.add_argument("--per-query", default=None, help="Write per-query latency/tokens/cost to this CSV")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON instead of markdown")
+    args = parser.parse_args(argv)
+
+    sample_size = 0 if args.queries else args.synthetic_queries
+    index = VectorIndex(HashingVectorizer(args.dims), sample_size=sample_size, seed=args.seed)
+    bytes_per_token = None
+    if args.chunks:
+        from split_chunk import ChunkExportReader
+        with ChunkExportReader(args.chunks) as reader:
+            for chunk in reader:
+                metadata = chunk['metadata']
+                tokens = metadata.get('token_count')
+                if tokens is None:
+                    tokens = count_tokens_batch([chunk['content']])[0]
+                index.add_chunk(chunk['file'], chunk['content'], tokens,
+                                metadata.get('start_line_no', 0) + 1, metadata.get('end_line_no', 0) + 1)
+    else:
+        totals = analyze_chunks_average(args.directory, workers=args.workers, chunker=args.chunker,
+                                        token_mode=args.token_mode, export=index)
+        bytes_per_token = totals.get('bytes_per_token')
+    if args.token_mode == "estimate" and bytes_per_token is None:
+        bytes_per_token = DEFAULT_BYTES_PER_TOKEN
+    index.build()
+
+    queries = load_queries(args.queries) if args.queries else synthetic_queries(index, args.synthetic_queries, args.seed)
+    if not queries:
+        sys.exit("No queries to replay")
+    summary, per_query = simulate(index, queries, args.top_k, args.token_budget, bytes_per_token)
+    if args.per_query:
+        write_per_query(per_query, args.per_query)
+    print(json.dumps(summary, indent=2) if args.json else render_markdown(summary))
+
+if __name__ == "__main__":
+    main()
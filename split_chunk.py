@@ -1,33 +1,246 @@
 import os
 import json
-from astchunk import ASTChunkBuilder
-
-def chunk_python_files_in_directory(directory_path, output_json_path):
-    configs = {
-        "max_chunk_size": 100,  # Maximum non-whitespace characters per chunk
-        "language": "python",  # Supported: python, java, csharp, typescript
-        "metadata_template": "default"  # Metadata format for output
-    }
-    chunk_builder = ASTChunkBuilder(**configs)
-    all_chunks = []
+import mmap
+import argparse
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from chunking import DEFAULT_CHUNK_CONFIG, ChunkLocator, get_chunk_builder, resolve_chunk_config
+from utils import IO_THREADS, decode_source, iter_python_files, iter_file_contents, analyze_chunks_average
+
+# Parallel chunking sends files to workers in batches of this many
+CHUNK_BATCH_FILES = 32
+
+# Streaming export layout: <output>.jsonl holds one JSON record per line, and
+# <output>.jsonl.src holds every file's UTF-8 source exactly once. Chunk records
+# point into the .src blob by byte offset/length; chunks whose content is not a
+# verbatim slice of the file carry it inline instead.
+SOURCE_SUFFIX = ".src"
+_CHUNK_PREFIX = b'{"type":"chunk"'
+_FILE_PREFIX = b'{"type":"file"'
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+class ChunkExportWriter:
+    """Writes chunks record by record, so memory use is bounded by the largest file."""
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.files_written = 0
+        self.chunks_written = 0
+        self._records = open(output_path, 'w', encoding='utf-8')
+        self._sources = open(output_path + SOURCE_SUFFIX, 'wb')
+        self._offset = 0
+
+    def add_file(self, file_path: str, code: str, chunks: list) -> int:
+        file_id = self.files_written
+        data = code.encode('utf-8', 'surrogatepass')
+        base = self._offset
+        self._sources.write(data)
+        self._offset += len(data)
+        self._records.write(_dumps({'type': 'file', 'file_id': file_id, 'path': file_path,
+                                    'offset': base, 'length': len(data)}) + "\n")
+
+        locator = ChunkLocator(data)
+        for i, chunk in enumerate(chunks):
+            record = {'type': 'chunk', 'file_id': file_id, 'chunk_index': i + 1}
+            content = chunk['content'].encode('utf-8', 'surrogatepass')
+            # Without a start line (metadata_template "none") the search continues after the previous chunk
+            position = locator.find(content, (chunk.get('metadata') or {}).get('start_line_no'))
+            if position >= 0:
+                record['offset'] = base + position
+                record['length'] = len(content)
+            else:
+                record['content'] = chunk['content']
+            record['metadata'] = chunk['metadata']
+            self._records.write(_dumps(record) + "\n")
+        self.files_written += 1
+        self.chunks_written += len(chunks)
+        return file_id
+
+    def close(self):
+        self._records.close()
+        self._sources.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _mmap_file(path: str):
+    f = open(path, 'rb')
+    if os.fstat(f.fileno()).st_size == 0:
+        return f, b""
+    return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class ChunkExportReader:
+    """Random access to a streaming export through mmap.
+
+    Opening scans the record file once for line offsets; records and sources are
+    only decoded when a chunk or file is requested.
+    """
+
+    def __init__(self, output_path: str):
+        self._records_file, self._records = _mmap_file(output_path)
+        self._sources_file, self._sources = _mmap_file(output_path + SOURCE_SUFFIX)
+        self._chunk_offsets = array('Q')
+        self._file_offsets = array('Q')
+        position, end = 0, len(self._records)
+        while position < end:
+            line_end = self._records.find(b"\n", position)
+            if line_end < 0:
+                line_end = end
+            prefix = self._records[position:position + len(_CHUNK_PREFIX)]
+            if prefix == _CHUNK_PREFIX:
+                self._chunk_offsets.append(position)
+            elif prefix.startswith(_FILE_PREFIX):
+                self._file_offsets.append(position)
+            position = line_end + 1
+
+    def _record(self, position: int) -> dict:
+        line_end = self._records.find(b"\n", position)
+        return json.loads(self._records[position:line_end if line_end >= 0 else len(self._records)])
+
+    def __len__(self) -> int:
+        return len(self._chunk_offsets)
 
-    for root, _, files in os.walk(directory_path):
-        for file in files:
-            if file.endswith('.py'):
-                file_path = os.path.join(root, file)
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    code = f.read()
-                chunks = chunk_builder.chunkify(code)
-                for i, chunk in enumerate(chunks):
-                    all_chunks.append({
-                        'file': file_path,
-                        'chunk_index': i + 1,
-                        'content': chunk['content'],
-                        'metadata': chunk['metadata'],
-                        'raw_code': code
-                    })
+    @property
+    def file_count(self) -> int:
+        return len(self._file_offsets)
+
+    def file(self, file_id: int) -> dict:
+        return self._record(self._file_offsets[file_id])
+
+    def source(self, file_id: int) -> str:
+        record = self.file(file_id)
+        return bytes(self._sources[record['offset']:record['offset'] + record['length']]).decode('utf-8', 'surrogatepass')
+
+    def __getitem__(self, index: int) -> dict:
+        record = self._record(self._chunk_offsets[index])
+        content = record.get('content')
+        if content is None:
+            content = bytes(self._sources[record['offset']:record['offset'] + record['length']]).decode('utf-8', 'surrogatepass')
+        return {
+            'file': self.file(record['file_id'])['path'],
+            'chunk_index': record['chunk_index'],
+            'content': content,
+            'metadata': record['metadata'],
+        }
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        for mapped in (self._records, self._sources):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        self._records_file.close()
+        self._sources_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _init_chunk_worker(chunk_config: dict):
+    # Build this worker's ASTChunkBuilder up front; chunking.get_chunk_builder reuses it
+    get_chunk_builder(chunk_config)
+
+def _chunk_data(file_path: str, data: bytes, chunk_config: dict) -> Optional[Tuple[str, str, list]]:
+    # Files that are not valid UTF-8 are skipped, as in the scan that writes the jsonl export
+    code = decode_source(data)
+    if code is None:
+        return None
+    return file_path, code, get_chunk_builder(chunk_config).chunkify(code)
+
+def _chunk_batch(file_paths: List[str], chunk_config: dict, io_threads: int = IO_THREADS) -> List[Tuple[str, str, list]]:
+    results = (_chunk_data(file_path, data, chunk_config) for file_path, data in iter_file_contents(file_paths, io_threads))
+    return [result for result in results if result is not None]
+
+def iter_file_chunks(directory_path: str, chunk_config: Optional[dict] = None, workers: Optional[int] = None,
+                     io_threads: int = IO_THREADS) -> Iterator[Tuple[str, str, list]]:
+    """Yield (file_path, code, chunks) per Python file in walk order.
+
+    With workers > 1 batches go to a process pool whose workers each build one
+    ASTChunkBuilder; at most 2 * workers batches are in flight and results are
+    yielded in submission order, so output is identical to the serial path.
+    File contents are prefetched by io_threads threads per process.
+    """
+    chunk_config = resolve_chunk_config(chunk_config)
+    paths = (file_path for file_path, _ in iter_python_files(directory_path))
+    if not workers or workers <= 1:
+        for file_path, data in iter_file_contents(paths, io_threads):
+            result = _chunk_data(file_path, data, chunk_config)
+            if result is not None:
+                yield result
+        return
+
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_chunk_worker, initargs=(chunk_config,)) as executor:
+        batch = []
+        for file_path in paths:
+            batch.append(file_path)
+            if len(batch) >= CHUNK_BATCH_FILES:
+                in_flight.append(executor.submit(_chunk_batch, batch, chunk_config, io_threads))
+                batch = []
+                while len(in_flight) > workers * 2:
+                    yield from in_flight.popleft().result()
+        if batch:
+            in_flight.append(executor.submit(_chunk_batch, batch, chunk_config, io_threads))
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+def chunk_python_files_in_directory(directory_path, output_json_path, export_format="json", chunk_config=None,
+                                    workers=None, token_mode="exact", io_threads=IO_THREADS):
+    """Export astchunk chunks. The "jsonl" export runs through utils' scan, so the same parse
+    also counts each chunk's tokens (stored in its metadata); the totals are returned."""
+    if export_format == "jsonl":
+        with ChunkExportWriter(output_json_path) as writer:
+            return analyze_chunks_average(directory_path, workers=workers, token_mode=token_mode,
+                                          chunker="astchunk", chunk_config=chunk_config, export=writer,
+                                          io_threads=io_threads)
+
+    file_chunks = iter_file_chunks(directory_path, chunk_config, workers, io_threads)
+
+    all_chunks = []
+    for file_path, code, chunks in file_chunks:
+        for i, chunk in enumerate(chunks):
+            all_chunks.append({
+                'file': file_path,
+                'chunk_index': i + 1,
+                'content': chunk['content'],
+                'metadata': chunk['metadata'],
+                'raw_code': code
+            })
     with open(output_json_path, 'w', encoding='utf-8') as out_f:
         json.dump(all_chunks, out_f, indent=2, ensure_ascii=False)
 
 if __name__ == "__main__":
-    chunk_python_files_in_directory("url-shortener", "chunks_output.json")
+    parser = argparse.ArgumentParser(description="Chunk every Python file in a directory with astchunk")
+    parser.add_argument("directory", nargs="?", default="url-shortener")
+    parser.add_argument("output", nargs="?", default="chunks_output.json")
+    parser.add_argument("--format", dest="export_format", choices=("json", "jsonl"), default="json",
+                        help="'jsonl' streams records and stores each source once (plus <output>.src)")
+    parser.add_argument("--token-mode", choices=("exact", "estimate"), default="exact",
+                        help="How the jsonl export counts chunk tokens")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for chunking (default: serial)")
+    parser.add_argument("--io-threads", type=int, default=IO_THREADS,
+                        help="Threads per process reading files ahead of chunking (1 reads synchronously)")
+    parser.add_argument("--max-chunk-size", type=int, default=DEFAULT_CHUNK_CONFIG["max_chunk_size"],
+                        help="Maximum non-whitespace characters per chunk")
+    parser.add_argument("--language", default=DEFAULT_CHUNK_CONFIG["language"],
+                        help="astchunk language: python, java, csharp, typescript")
+    parser.add_argument("--metadata-template", default=DEFAULT_CHUNK_CONFIG["metadata_template"],
+                        help="astchunk metadata format")
+    args = parser.parse_args()
+    chunk_config = {"max_chunk_size": args.max_chunk_size, "language": args.language,
+                    "metadata_template": args.metadata_template}
+    stats = chunk_python_files_in_directory(args.directory, args.output, args.export_format, chunk_config, args.workers,
+                                            args.token_mode, args.io_threads)
+    if stats is not None:
+        print(json.dumps(stats, indent=2))
@@ -1,65 +1,476 @@
 import os
-import ast
-import tiktoken
-from typing import List, Dict
+import heapq
+import time
+import hashlib
+from functools import partial
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Iterator, Iterable, Callable
+from chunk_cache import ChunkCache, content_digest
+from chunking import DEFAULT_CHUNKER, chunk_spans, chunker_key, export_chunks
+from profiling import PROFILER
 
-tokenizer = tiktoken.encoding_for_model("gpt-4")
+# Cache entries produced by this chunker/tokenizer pair; change it when either changes
+CACHE_NAMESPACE = "ast_walk:gpt-4"
+
+# Streaming mode hands files to the pool in batches of this many bytes/files
+STREAM_BATCH_BYTES = 1 << 20
+STREAM_BATCH_FILES = 64
+
+# Token counts remembered per text hash, so repeated boilerplate is encoded once per process
+TOKEN_MEMO_SIZE = 65536
+_token_memo = OrderedDict()
+
+# Estimate mode: token counts from UTF-8 byte length, calibrated on a sample of files
+DEFAULT_BYTES_PER_TOKEN = 4.0
+CALIBRATION_FILES = 50
+
+# Ingestion: file contents are read ahead by a small thread pool, in order, so parsing does
+# not sit idle on NFS/cold-cache latency. At most PREFETCH_DEPTH reads are queued at once.
+IO_THREADS = 8
+PREFETCH_DEPTH = 64
+
+# The encoder is loaded on first use (tiktoken import + BPE tables), once per process
+_tokenizer = None
+TOKENIZER_LOAD_SECONDS = None
+
+def get_tokenizer():
+    global _tokenizer, TOKENIZER_LOAD_SECONDS
+    if _tokenizer is None:
+        start = time.perf_counter()
+        import tiktoken
+        _tokenizer = tiktoken.encoding_for_model("gpt-4")
+        TOKENIZER_LOAD_SECONDS = time.perf_counter() - start
+        PROFILER.record("tokenizer load", TOKENIZER_LOAD_SECONDS)
+    return _tokenizer
+
+def __getattr__(name):
+    # `utils.tokenizer` still works, but only loads the encoder when accessed
+    if name == "tokenizer":
+        return get_tokenizer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _init_worker(profile: bool = False):
+    PROFILER.enabled = profile
+    PROFILER.reset()
+
+def make_executor(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(PROFILER.enabled,))
 
 def count_tokens(text: str) -> int:
-    return len(tokenizer.encode(text))
+    return len(get_tokenizer().encode(text))
+
+def estimate_tokens(text: str, bytes_per_token: float) -> int:
+    return round(len(text.encode('utf-8', 'surrogatepass')) / bytes_per_token)
+
+def cache_namespace(bytes_per_token: Optional[float] = None, chunker: str = DEFAULT_CHUNKER,
+                    chunk_config: Optional[Dict] = None) -> str:
+    namespace = CACHE_NAMESPACE
+    if chunker != DEFAULT_CHUNKER:
+        namespace = f"{namespace}:{chunker_key(chunker, chunk_config)}"
+    if bytes_per_token is not None:
+        namespace = f"{namespace}:estimate:{bytes_per_token:.4f}"
+    return namespace
+
+def clear_token_memo():
+    _token_memo.clear()
+
+def count_tokens_batch(texts: List[str], bytes_per_token: Optional[float] = None) -> List[int]:
+    """Token counts for many texts: memo lookups first, then encode_ordinary for the rest.
+
+    encode_ordinary_batch is avoided on purpose: it starts a fresh thread pool per call,
+    which costs more than it saves on one file's chunks and oversubscribes the worker
+    processes. With bytes_per_token the counts are estimated from byte length and tiktoken
+    is never loaded.
+    """
+    if bytes_per_token is not None:
+        return [estimate_tokens(text, bytes_per_token) for text in texts]
+    counts = [0] * len(texts)
+    missing = {}
+    for i, text in enumerate(texts):
+        key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        count = _token_memo.get(key)
+        if count is not None:
+            _token_memo.move_to_end(key)
+            counts[i] = count
+        else:
+            missing.setdefault(key, (text, []))[1].append(i)
+    if missing:
+        encode = get_tokenizer().encode_ordinary
+        with PROFILER.stage("tokenize"):
+            encoded = [(key, len(encode(text))) for key, (text, _) in missing.items()]
+        for key, count in encoded:
+            for i in missing[key][1]:
+                counts[i] = count
+            _token_memo[key] = count
+        while len(_token_memo) > TOKEN_MEMO_SIZE:
+            _token_memo.popitem(last=False)
+    return counts
+
+def iter_python_files(directory: str) -> Iterator[Tuple[str, os.stat_result]]:
+    """Lazily yield (path, stat) for every .py file, in the same order as os.walk."""
+    try:
+        scanner = os.scandir(directory)
+    except OSError:
+        return
+    subdirs = []
+    with scanner:
+        for entry in scanner:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+            elif entry.name.endswith(".py"):
+                yield entry.path, entry.stat()
+    for subdir in subdirs:
+        yield from iter_python_files(subdir)
+
+def get_python_files_with_sizes(directory: str) -> Tuple[List[Tuple[str, int]], int]:
+    sized_files = []
+    size = 0
+    for file_path, st in iter_python_files(directory):
+        sized_files.append((file_path, st.st_size))
+        size += st.st_size
+    return sized_files, size
 
 def get_python_files(directory: str) -> List[str]:
-    py_files = []
-    size=0
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith(".py"):
-                py_files.append(os.path.join(root, file))
-                size+= os.path.getsize(os.path.join(root, file))
-    return py_files, size
+    sized_files, size = get_python_files_with_sizes(directory)
+    return [file_path for file_path, _ in sized_files], size
+
+def read_file_bytes(file_path: str) -> bytes:
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+class FilePrefetcher:
+    """FIFO of pending file reads: submit() starts a read on the I/O threads and pop()
+    returns the oldest (file_path, data). Read errors are raised by pop().
+
+    With io_threads <= 1 nothing is read ahead and pop() reads synchronously.
+    """
+
+    def __init__(self, io_threads: int = IO_THREADS):
+        self._executor = ThreadPoolExecutor(max_workers=io_threads) if io_threads > 1 else None
+        self._pending = deque()
+
+    def submit(self, file_path: str):
+        if self._executor is None:
+            self._pending.append((file_path, None))
+        else:
+            self._pending.append((file_path, self._executor.submit(read_file_bytes, file_path)))
+
+    def pop(self) -> Tuple[str, bytes]:
+        file_path, future = self._pending.popleft()
+        if future is None:
+            with PROFILER.stage("read"):
+                return file_path, read_file_bytes(file_path)
+        # Time the parser spends blocked on I/O; near zero when ingestion keeps up
+        with PROFILER.stage("read wait"):
+            return file_path, future.result()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_file_contents(file_paths: Iterable[str], io_threads: int = IO_THREADS,
+                       depth: int = PREFETCH_DEPTH) -> Iterator[Tuple[str, bytes]]:
+    """Yield (file_path, data) in input order while up to `depth` later files are being read."""
+    with FilePrefetcher(io_threads) as prefetcher:
+        for file_path in file_paths:
+            prefetcher.submit(file_path)
+            if len(prefetcher) > depth:
+                yield prefetcher.pop()
+        while len(prefetcher):
+            yield prefetcher.pop()
+
+def iter_ast_chunks(source: str) -> Iterator[Dict]:
+    # All chunks of a file are tokenized in one batch, then handed out one at a time
+    spans = chunk_spans(source)
+    token_counts = count_tokens_batch([code for _, _, _, code, _ in spans])
+    for (start_line, end_line, node_type, chunk_code, _), token_count in zip(spans, token_counts):
+        yield {
+            'start_line': start_line,
+            'end_line': end_line,
+            'token_count': token_count,
+            'type': node_type,
+            'code': chunk_code
+        }
 
 def split_by_ast_nodes(source: str) -> List[Dict]:
-    chunks = []
+    return list(iter_ast_chunks(source))
+
+def decode_source(data: bytes) -> Optional[str]:
+    # Same result as reading the file in text mode: strict UTF-8 plus universal newlines
     try:
-        tree = ast.parse(source)
-    except SyntaxError:
-        return []
-    lines = source.splitlines()
-    for node in ast.walk(tree):
-        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
-            start_line = node.lineno - 1
-            end_line = max(getattr(node, 'end_lineno', start_line + 1), start_line + 1)
-            chunk_lines = lines[start_line:end_line]
-            chunk_code = "\n".join(chunk_lines)
-            token_count = count_tokens(chunk_code)
-            chunks.append({
-                'start_line': start_line + 1,
-                'end_line': end_line,
-                'token_count': token_count,
-                'type': type(node).__name__,
-                'code': chunk_code
-            })
-    return chunks
-
-def analyze_chunks_average(directory: str) -> Dict:
+        source = data.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    return source.replace('\r\n', '\n').replace('\r', '\n')
+
+# (start_line, end_line, node_type, token_count) for one chunk
+ChunkStat = Tuple[int, int, str, int]
+
+# Per-file record: (file_path, digest, chunk_count, token_count, export, chunk_rows), where
+# export is (source, chunk dicts) when the scan also writes a chunk export and chunk_rows
+# are filled when it collects a per-chunk breakdown; both are None otherwise
+FileRecord = Tuple[str, bytes, int, int, Optional[Tuple[str, List[Dict]]], Optional[List[ChunkStat]]]
+
+def _analyze_file_record(file_path: str, data: bytes, bytes_per_token: Optional[float] = None,
+                         chunker: str = DEFAULT_CHUNKER, chunk_config: Optional[Dict] = None,
+                         export: bool = False, chunk_rows: bool = False) -> FileRecord:
+    source = decode_source(data)
+    if source is None:
+        return file_path, content_digest(data), 0, 0, None, [] if chunk_rows else None
+    # One parse feeds the token counts, the chunk export and the per-chunk breakdown
+    spans = chunk_spans(source, chunker, chunk_config)
+    token_counts = count_tokens_batch([code for _, _, _, code, _ in spans], bytes_per_token)
+    exported = (source, export_chunks(spans, token_counts)) if export else None
+    rows = None
+    if chunk_rows:
+        rows = [(start_line, end_line, node_type, token_count)
+                for (start_line, end_line, node_type, _, _), token_count in zip(spans, token_counts)]
+    return file_path, content_digest(data), len(token_counts), sum(token_counts), exported, rows
+
+def analyze_file(file_path: str, bytes_per_token: Optional[float] = None, chunker: str = DEFAULT_CHUNKER,
+                 chunk_config: Optional[Dict] = None) -> Tuple[int, int]:
+    """Return (chunk_count, token_count) for a single file."""
+    with PROFILER.stage("read"):
+        data = read_file_bytes(file_path)
+    _, _, chunks, tokens, _, _ = _analyze_file_record(file_path, data, bytes_per_token, chunker, chunk_config)
+    return chunks, tokens
+
+def _analyze_batch(file_paths: List[str], io_threads: int = IO_THREADS, **options) -> List[FileRecord]:
+    # The batch's remaining files are read while earlier ones are parsed and tokenized
+    return [_analyze_file_record(file_path, data, **options)
+            for file_path, data in iter_file_contents(file_paths, io_threads)]
+
+def _worker_batch(file_paths: List[str], io_threads: int = IO_THREADS, **options) -> Tuple[List[FileRecord], Dict]:
+    # Pool entry point: ships this worker's profile counters back with the records
+    return _analyze_batch(file_paths, io_threads, **options), PROFILER.drain()
+
+def calibrate_bytes_per_token(directory: str, sample_files: int = CALIBRATION_FILES, chunker: str = DEFAULT_CHUNKER,
+                              chunk_config: Optional[Dict] = None) -> float:
+    """UTF-8 bytes per exact token over chunks from an evenly spaced sample of files."""
+    files = [file_path for file_path, _ in iter_python_files(directory)]
+    step = max(1, len(files) // sample_files)
+    total_bytes = 0
     total_tokens = 0
-    total_chunks = 0
-    files, size = get_python_files(directory)
-    for file_path in files:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            try:
-                source = f.read()
-            except Exception:
+    for file_path in files[::step][:sample_files]:
+        with open(file_path, 'rb') as f:
+            source = decode_source(f.read())
+        if source is None:
+            continue
+        texts = [code for _, _, _, code, _ in chunk_spans(source, chunker, chunk_config)]
+        total_bytes += sum(len(text.encode('utf-8', 'surrogatepass')) for text in texts)
+        total_tokens += sum(count_tokens_batch(texts))
+    return total_bytes / total_tokens if total_tokens > 0 else DEFAULT_BYTES_PER_TOKEN
+
+def balanced_batches(sized_files: List[Tuple[str, int]], n_batches: int) -> List[List[str]]:
+    """Greedy largest-first split of files into batches of roughly equal byte size."""
+    n_batches = max(1, min(n_batches, len(sized_files)))
+    heap = [(0, i) for i in range(n_batches)]
+    batches = [[] for _ in range(n_batches)]
+    for file_path, file_size in sorted(sized_files, key=lambda item: item[1], reverse=True):
+        load, i = heapq.heappop(heap)
+        batches[i].append(file_path)
+        heapq.heappush(heap, (load + file_size, i))
+    return [batch for batch in batches if batch]
+
+def analyze_files(file_paths: List[str], workers: Optional[int] = None,
+                  io_threads: int = IO_THREADS) -> Iterator[Tuple[str, int, int, int]]:
+    """(file_path, size, chunk_count, token_count) for an explicit list of files, in
+    size-balanced batches on a process pool when workers > 1. Missing files raise OSError."""
+    sized_files = [(file_path, os.stat(file_path).st_size) for file_path in file_paths]
+    sizes = dict(sized_files)
+    if not workers or workers <= 1 or len(sized_files) < 2:
+        for file_path, data in iter_file_contents(file_paths, io_threads):
+            record = _analyze_file_record(file_path, data)
+            yield file_path, sizes[file_path], record[2], record[3]
+        return
+    with make_executor(workers) as executor:
+        batches = balanced_batches(sized_files, workers * 4)
+        for records, worker_stats in executor.map(partial(_worker_batch, io_threads=io_threads), batches):
+            PROFILER.merge(worker_stats, " (workers)")
+            for file_path, _, chunks, tokens, _, _ in records:
+                yield file_path, sizes[file_path], chunks, tokens
+
+def iter_file_stats(directory: str, workers: Optional[int] = None, cache: Optional[ChunkCache] = None,
+                    stream: bool = False, executor: Optional[ProcessPoolExecutor] = None,
+                    bytes_per_token: Optional[float] = None, chunker: str = DEFAULT_CHUNKER,
+                    chunk_config: Optional[Dict] = None, export=None, io_threads: int = IO_THREADS,
+                    breakdown=None) -> Iterator[Tuple[str, int, int, int]]:
+    """Yield (file_path, size, chunk_count, token_count) for every Python file.
+
+    By default the tree is walked up front so the pool gets size-balanced batches.
+    With stream=True files are chunked as the walk finds them and at most
+    2 * workers batches are in flight, so memory stays flat on huge trees.
+    A caller-owned executor (created with make_executor) is used instead of a
+    private pool and left running afterwards. bytes_per_token switches to estimated counts.
+
+    export is a writer with add_file(file_path, source, chunks) (split_chunk.ChunkExportWriter):
+    every file's chunks are passed to it from the same parse that produced the counts, in
+    walk order. Exporting streams and skips cache lookups, since it needs the chunk bodies.
+    breakdown (breakdown.ScanBreakdown) likewise receives add_file(file_path, size, chunk_rows).
+
+    File contents are prefetched by io_threads threads per process (see FilePrefetcher);
+    io_threads=1 reads synchronously.
+    """
+    parallel = bool(workers and workers > 1)
+    own_executor = executor is None
+    namespace = cache_namespace(bytes_per_token, chunker, chunk_config)
+    options = {'bytes_per_token': bytes_per_token, 'chunker': chunker, 'chunk_config': chunk_config,
+               'export': export is not None, 'chunk_rows': breakdown is not None}
+    worker_batch = partial(_worker_batch, io_threads=io_threads, **options)
+    prefetcher = FilePrefetcher(io_threads)
+    per_chunk = export is not None or breakdown is not None
+    if per_chunk:
+        stream = True
+    pending_stats = {}
+    to_process = []
+    batch_bytes = 0
+    in_flight = deque()
+
+    def drain(result):
+        records, worker_stats = result
+        PROFILER.merge(worker_stats, " (workers)")
+        return records
+
+    def finish(record):
+        file_path, digest, chunks, tokens, exported, rows = record
+        st = pending_stats.pop(file_path)
+        if exported is not None:
+            with PROFILER.stage("export"):
+                export.add_file(file_path, *exported)
+        if rows is not None:
+            breakdown.add_file(file_path, st.st_size, rows)
+        if cache is not None:
+            cache.store(namespace, file_path, st, digest, chunks, tokens)
+        return file_path, st.st_size, chunks, tokens
+
+    try:
+        for file_path, st in PROFILER.iterate("walk", iter_python_files(directory)):
+            cached = None
+            if cache is not None and not per_chunk:
+                with PROFILER.stage("cache lookup"):
+                    cached = cache.lookup(namespace, file_path, st)
+            if cached is not None:
+                yield file_path, st.st_size, cached[0], cached[1]
                 continue
-        chunks = split_by_ast_nodes(source)
-        total_chunks += len(chunks)
-        total_tokens += sum(chunk['token_count'] for chunk in chunks)
+            pending_stats[file_path] = st
+            if not stream:
+                to_process.append((file_path, st.st_size))
+            elif not parallel:
+                prefetcher.submit(file_path)
+                while len(prefetcher) > PREFETCH_DEPTH:
+                    yield finish(_analyze_file_record(*prefetcher.pop(), **options))
+            else:
+                to_process.append(file_path)
+                batch_bytes += st.st_size
+                if batch_bytes >= STREAM_BATCH_BYTES or len(to_process) >= STREAM_BATCH_FILES:
+                    if executor is None:
+                        executor = make_executor(workers)
+                    in_flight.append(executor.submit(worker_batch, to_process))
+                    to_process = []
+                    batch_bytes = 0
+                    while in_flight and (len(in_flight) > workers * 2 or in_flight[0].done()):
+                        for record in drain(in_flight.popleft().result()):
+                            yield finish(record)
+
+        if stream:
+            while len(prefetcher):
+                yield finish(_analyze_file_record(*prefetcher.pop(), **options))
+            if to_process:
+                if executor is None:
+                    executor = make_executor(workers)
+                in_flight.append(executor.submit(worker_batch, to_process))
+            while in_flight:
+                for record in drain(in_flight.popleft().result()):
+                    yield finish(record)
+        elif parallel and len(to_process) > 1:
+            # Several batches per worker so one slow batch doesn't leave the rest of the pool idle
+            batches = balanced_batches(to_process, workers * 4)
+            if executor is None:
+                executor = make_executor(workers)
+            for result in executor.map(worker_batch, batches):
+                for record in drain(result):
+                    yield finish(record)
+        else:
+            paths = [file_path for file_path, _ in to_process]
+            for file_path, data in iter_file_contents(paths, io_threads):
+                yield finish(_analyze_file_record(file_path, data, **options))
+    finally:
+        prefetcher.close()
+        if own_executor and executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def summarize_totals(files_processed: int, total_chunks: int, total_tokens: int, size: int) -> Dict:
     avg_tokens_per_chunk = total_tokens / total_chunks if total_chunks > 0 else 0
     return {
-        'files_processed': len(files),
+        'files_processed': files_processed,
         'total_chunks': total_chunks,
         'total_tokens': total_tokens,
         'size': size,
         'avg_tokens_per_chunk': avg_tokens_per_chunk
     }
 
+def analyze_chunks_average(directory: str, workers: Optional[int] = None, cache: Optional[ChunkCache] = None,
+                           stream: bool = False, progress: Optional[Callable[[Dict], None]] = None,
+                           progress_every: int = 1000, executor: Optional[ProcessPoolExecutor] = None,
+                           token_mode: str = "exact", bytes_per_token: Optional[float] = None,
+                           chunker: str = DEFAULT_CHUNKER, chunk_config: Optional[Dict] = None, export=None,
+                           io_threads: int = IO_THREADS, breakdown=None) -> Dict:
+    """Repo-wide chunk/token totals.
+
+    token_mode="estimate" derives token counts from byte length: bytes_per_token if
+    given, otherwise a ratio calibrated with exact counts on a sample of files.
+    chunker picks the chunking.CHUNKERS strategy; with export the same scan also
+    writes the chunk export, and with breakdown it fills per-file/per-chunk records
+    (see iter_file_stats).
+    """
+    if token_mode == "estimate":
+        if bytes_per_token is None:
+            with PROFILER.stage("calibrate"):
+                bytes_per_token = calibrate_bytes_per_token(directory, chunker=chunker, chunk_config=chunk_config)
+    elif token_mode == "exact":
+        bytes_per_token = None
+    else:
+        raise ValueError(f"Unknown token_mode: {token_mode!r}")
+    files_processed = 0
+    total_tokens = 0
+    total_chunks = 0
+    size = 0
+    if cache is not None:
+        hits_before, misses_before = cache.hits, cache.misses
+    file_stats = iter_file_stats(directory, workers=workers, cache=cache, stream=stream, executor=executor,
+                                 bytes_per_token=bytes_per_token, chunker=chunker, chunk_config=chunk_config,
+                                 export=export, io_threads=io_threads, breakdown=breakdown)
+    for _, file_size, chunks, tokens in file_stats:
+        files_processed += 1
+        size += file_size
+        total_chunks += chunks
+        total_tokens += tokens
+        if progress is not None and files_processed % progress_every == 0:
+            progress(summarize_totals(files_processed, total_chunks, total_tokens, size))
+    result = summarize_totals(files_processed, total_chunks, total_tokens, size)
+    if chunker != DEFAULT_CHUNKER:
+        result['chunker'] = chunker_key(chunker, chunk_config)
+    if bytes_per_token is not None:
+        result['token_mode'] = "estimate"
+        result['bytes_per_token'] = bytes_per_token
+    if cache is not None:
+        with PROFILER.stage("cache write"):
+            cache.flush()
+        result['cache_hits'] = cache.hits - hits_before
+        result['cache_misses'] = cache.misses - misses_before
+    return result
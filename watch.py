@@ -0,0 +1,242 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from chunk_cache import ChunkCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES
+from chunking import CHUNKERS, DEFAULT_CHUNKER
+from combined_analyzer import OUTPUT_FORMATS, RENDERERS, build_project_analysis
+from profiling import PROFILER
+from utils import analyze_file, iter_file_stats, iter_python_files, summarize_totals
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_POLL_INTERVAL = 1.0
+# A changed file is re-chunked once its (mtime, size) has been stable this long
+DEFAULT_DEBOUNCE = 0.5
+
+CONTENT_TYPES = {
+    "markdown": "text/markdown; charset=utf-8",
+    "latex": "application/x-latex; charset=utf-8",
+    "json": "application/json",
+}
+
+# (mtime_ns, size) identifies a file version between polls
+Signature = Tuple[int, int]
+
+def _signature(st) -> Signature:
+    return st.st_mtime_ns, st.st_size
+
+class RepoWatcher:
+    """Per-file chunk/token stats for one repo, kept current by polling.
+
+    start() runs one full scan; afterwards poll() walks the tree (stat results come
+    from os.scandir, nothing is read) and re-chunks only files whose signature changed
+    and then held still for `debounce` seconds. Rendered reports are cached until the
+    stats change, so serving one is a dictionary lookup.
+    """
+
+    def __init__(self, project_root: str, debounce: float = DEFAULT_DEBOUNCE, **scan_options):
+        self.project_root = project_root
+        self.debounce = debounce
+        self.scan_options = scan_options
+        self.files: Dict[str, Tuple[int, int, int]] = {}
+        self.signatures: Dict[str, Signature] = {}
+        # path -> (signature last seen or None if deleted, when it was first seen)
+        self.pending: Dict[str, Tuple[Optional[Signature], float]] = {}
+        self.version = 0
+        self.updates = 0
+        self.last_update: Optional[Dict] = None
+        self._totals = [0, 0, 0, 0]
+        self._reports: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Signatures are taken before the scan, so an edit racing the scan is re-chunked on the first poll
+        self.signatures = {file_path: _signature(st) for file_path, st in iter_python_files(self.project_root)}
+        with PROFILER.stage("initial scan"):
+            for file_path, size, chunks, tokens in iter_file_stats(self.project_root, **self.scan_options):
+                self.files[file_path] = (size, chunks, tokens)
+        cache = self.scan_options.get('cache')
+        if cache is not None:
+            cache.flush()
+        with self._lock:
+            self._recount()
+
+    def _recount(self):
+        totals = [len(self.files), 0, 0, 0]
+        for size, chunks, tokens in self.files.values():
+            totals[1] += chunks
+            totals[2] += tokens
+            totals[3] += size
+        self._totals = totals
+        self._reports = {}
+        self.version += 1
+
+    def poll(self, now: Optional[float] = None) -> List[str]:
+        """Check the tree once and apply every settled change; returns the touched paths."""
+        now = time.monotonic() if now is None else now
+        with PROFILER.stage("poll"):
+            current = {file_path: _signature(st) for file_path, st in iter_python_files(self.project_root)}
+        for file_path in self.signatures.keys() | current.keys():
+            signature = current.get(file_path)
+            if signature == self.signatures.get(file_path):
+                self.pending.pop(file_path, None)
+                continue
+            seen = self.pending.get(file_path)
+            if seen is None or seen[0] != signature:
+                self.pending[file_path] = (signature, now)
+
+        settled = [file_path for file_path, (_, since) in self.pending.items() if now - since >= self.debounce]
+        if not settled:
+            return []
+        updated = {}
+        for file_path in settled:
+            signature, _ = self.pending.pop(file_path)
+            if signature is None:
+                updated[file_path] = None
+                continue
+            try:
+                with PROFILER.stage("rechunk"):
+                    chunks, tokens = analyze_file(file_path, bytes_per_token=self.scan_options.get('bytes_per_token'),
+                                                  chunker=self.scan_options.get('chunker', DEFAULT_CHUNKER),
+                                                  chunk_config=self.scan_options.get('chunk_config'))
+            except OSError:
+                # Vanished or unreadable mid-poll; the next poll sees its real state
+                continue
+            updated[file_path] = (signature, (signature[1], chunks, tokens))
+
+        with self._lock:
+            affected_chunks = affected_tokens = 0
+            for file_path, update in updated.items():
+                if update is None:
+                    self.signatures.pop(file_path, None)
+                    self.files.pop(file_path, None)
+                    continue
+                self.signatures[file_path], self.files[file_path] = update
+                affected_chunks += update[1][1]
+                affected_tokens += update[1][2]
+            self._recount()
+            self.updates += 1
+            self.last_update = {
+                'files_changed': sum(1 for update in updated.values() if update is not None),
+                'files_deleted': sum(1 for update in updated.values() if update is None),
+                'affected_chunks': affected_chunks,
+                'affected_tokens': affected_tokens,
+                'time': time.time(),
+            }
+        return list(updated)
+
+    def chunk_analysis(self) -> Dict:
+        files_processed, total_chunks, total_tokens, size = self._totals
+        result = summarize_totals(files_processed, total_chunks, total_tokens, size)
+        chunker = self.scan_options.get('chunker', DEFAULT_CHUNKER)
+        if chunker != DEFAULT_CHUNKER:
+            result['chunker'] = chunker
+        return result
+
+    def report(self, fmt: str) -> str:
+        with self._lock:
+            output = self._reports.get(fmt)
+            if output is None:
+                with PROFILER.stage(f"render {fmt}"):
+                    analysis = build_project_analysis(self.project_root, self.chunk_analysis())
+                    output = self._reports[fmt] = RENDERERS[fmt](analysis)
+            return output
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'project_root': self.project_root,
+                'version': self.version,
+                'updates': self.updates,
+                'pending': len(self.pending),
+                'last_update': self.last_update,
+                **self.chunk_analysis(),
+            }
+
+    def run(self, stop: threading.Event, interval: float = DEFAULT_POLL_INTERVAL):
+        while not stop.wait(interval):
+            touched = self.poll()
+            if touched:
+                print(f"[watch] re-chunked {len(touched):,} file(s); {self._totals[2]:,} tokens total",
+                      file=sys.stderr, flush=True)
+
+def make_handler(watcher: RepoWatcher):
+    routes = {"/": "markdown", "/markdown": "markdown", "/latex": "latex", "/json": "json"}
+
+    class ReportHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/") or "/"
+            if path == "/status":
+                body, content_type = json.dumps(watcher.status(), indent=2), CONTENT_TYPES["json"]
+            elif path in routes:
+                fmt = routes[path]
+                body, content_type = watcher.report(fmt), CONTENT_TYPES[fmt]
+            else:
+                self.send_error(404, f"Try one of: {', '.join(sorted(routes))}, /status")
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("X-Report-Version", str(watcher.version))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReportHandler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep a project's chunk/token stats live and serve the cost report over HTTP")
+    parser.add_argument("directory", nargs="?", default=".", help="Project root to watch")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to bind (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"HTTP port (default: {DEFAULT_PORT})")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL, help="Seconds between polls")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                        help="Seconds a changed file must stay unchanged before it is re-chunked")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for the initial scan")
+    parser.add_argument("--chunker", choices=CHUNKERS, default=DEFAULT_CHUNKER, help="Chunking strategy")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the on-disk per-file cache for the initial scan")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="SQLite file for per-file results")
+    parser.add_argument("--cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Evict least recently used files beyond this many cache entries")
+    parser.add_argument("--profile", action="store_true", help="Print per-stage timings on exit")
+    args = parser.parse_args(argv)
+    PROFILER.enabled = args.profile
+
+    cache = None if args.no_cache else ChunkCache(args.cache_path, args.cache_max_entries)
+    watcher = RepoWatcher(args.directory, args.debounce, workers=args.workers, cache=cache, chunker=args.chunker)
+    start = time.perf_counter()
+    try:
+        watcher.start()
+    finally:
+        if cache is not None:
+            cache.close()
+    # Polls re-chunk single files in this process; the cache only serves the warm-up scan
+    watcher.scan_options.pop('cache', None)
+    print(f"[watch] {len(watcher.files):,} files scanned in {time.perf_counter() - start:.2f}s; "
+          f"serving http://{args.host}:{args.port}/ ({', '.join(OUTPUT_FORMATS)}, status)", file=sys.stderr, flush=True)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(watcher))
+    stop = threading.Event()
+    poller = threading.Thread(target=watcher.run, args=(stop, args.interval), daemon=True)
+    poller.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        poller.join()
+        if args.profile:
+            print(PROFILER.report(), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()